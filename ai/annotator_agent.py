@@ -1,15 +1,26 @@
+import logging
 import os
+from pathlib import Path
 from langgraph.graph import StateGraph
+from langgraph.graph.state import CompiledStateGraph
 
 from langgraph.types import Command
 from langchain_ollama import ChatOllama
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
 from utils import get_openrouter_base_url, get_openrouter_api_key
+from ai.model_router import model_router
+from ai.checkpointer import get_checkpointer
 
 from pydantic import BaseModel
 from typing import Annotated, Literal
 
+logger = logging.getLogger(__name__)
+
+MEME_OVERVIEW_PROMPT = (
+    Path(__file__).parent / "prompts" / "meme_overview.md"
+).read_text()
+
 
 class SerperSearchResults(BaseModel):
     """Search results from Google Serper."""
@@ -66,18 +77,9 @@ async def meme_overview(state: WorkflowState) -> Command[Literal["__end__", "tra
             str, "Sentiment of the meme image, e.g., 'positive', 'negative', 'neutral'"
         ]
 
-    llm = ChatOpenAI(
-        base_url=get_openrouter_base_url(),
-        api_key=get_openrouter_api_key(),
-        model="google/gemini-2.0-flash-001",
-        temperature=0.5,
-    ).with_structured_output(ExpectedOutput)
-
-    with open("ai/prompts/meme_overview.md", "r") as f:
-        system_prompt_text = f.read()
     system_prompt = ChatPromptTemplate.from_messages(
         [
-            ("system", system_prompt_text),
+            ("system", MEME_OVERVIEW_PROMPT),
             (
                 "human",
                 [
@@ -94,11 +96,20 @@ async def meme_overview(state: WorkflowState) -> Command[Literal["__end__", "tra
         ]
     )
 
-    overview_chain = system_prompt | llm
-
-    response = await overview_chain.ainvoke(input={"image_url": state.image_url})
+    def build_overview_chain(model: str):
+        llm = ChatOpenAI(
+            base_url=get_openrouter_base_url(),
+            api_key=get_openrouter_api_key(),
+            model=model,
+            temperature=0.5,
+        ).with_structured_output(ExpectedOutput)
+        return system_prompt | llm
+
+    response = await model_router.ainvoke(
+        "overview", build_overview_chain, {"image_url": state.image_url}
+    )
 
-    print("Response from meme overview chain:", response)
+    logger.debug("Response from meme overview chain: %s", response)
 
     if isinstance(response, ExpectedOutput):
         return Command(
@@ -114,7 +125,8 @@ async def meme_overview(state: WorkflowState) -> Command[Literal["__end__", "tra
             },
         )
     else:
-        return Command(goto="__end__")
+        # Raise so the checkpoint stays before this node and a retry reruns it
+        raise ValueError(f"Unexpected meme overview response: {response!r}")
 
 
 async def translator(state: WorkflowState) -> Command[Literal["__end__"]]:
@@ -127,12 +139,6 @@ async def translator(state: WorkflowState) -> Command[Literal["__end__"]]:
 
         translated_explanation: Annotated[str, "The explanation translated in Bengali"]
 
-    translator_llm = ChatOpenAI(
-        base_url=get_openrouter_base_url(),
-        api_key=get_openrouter_api_key(),
-        model="deepseek/deepseek-r1-0528:free",
-    ).with_structured_output(TranslationOutput)
-
     translator_prompt = ChatPromptTemplate.from_messages(
         [
             (
@@ -153,12 +159,19 @@ async def translator(state: WorkflowState) -> Command[Literal["__end__"]]:
         ]
     )
 
-    translator_chain = translator_prompt | translator_llm
-    translator_response = await translator_chain.ainvoke(
-        {"explanation": state.explanation}
+    def build_translator_chain(model: str):
+        translator_llm = ChatOpenAI(
+            base_url=get_openrouter_base_url(),
+            api_key=get_openrouter_api_key(),
+            model=model,
+        ).with_structured_output(TranslationOutput)
+        return translator_prompt | translator_llm
+
+    translator_response = await model_router.ainvoke(
+        "translate", build_translator_chain, {"explanation": state.explanation}
     )
 
-    print("Translator response:", translator_response)
+    logger.debug("Translator response: %s", translator_response)
 
     if isinstance(translator_response, TranslationOutput):
         return Command(
@@ -166,7 +179,8 @@ async def translator(state: WorkflowState) -> Command[Literal["__end__"]]:
             update={"explanation": translator_response.translated_explanation},
         )
     else:
-        return Command(goto="__end__")
+        # Raise so a retry resumes here instead of repeating the overview
+        raise ValueError(f"Unexpected translator response: {translator_response!r}")
 
 
 workflow = StateGraph(WorkflowState)
@@ -177,5 +191,16 @@ workflow.set_entry_point("meme_overview_node")
 
 AnnotatorAgent = workflow.compile()
 
+_checkpointed_agent: CompiledStateGraph | None = None
+
+
+async def get_annotator_agent() -> CompiledStateGraph:
+    """AnnotatorAgent compiled with the durable checkpointer, so failed runs can resume."""
+    global _checkpointed_agent
+    if _checkpointed_agent is None:
+        _checkpointed_agent = workflow.compile(checkpointer=await get_checkpointer())
+    return _checkpointed_agent
+
 
-print(AnnotatorAgent.get_graph().draw_ascii())
+if logger.isEnabledFor(logging.DEBUG):
+    logger.debug("Annotator graph:\n%s", AnnotatorAgent.get_graph().draw_ascii())
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict
+
+import aiosqlite
+from dotenv import load_dotenv
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.graph.state import CompiledStateGraph
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", "checkpoints.sqlite")
+
+_checkpointer: AsyncSqliteSaver | None = None
+_checkpointer_lock = asyncio.Lock()
+
+
+async def get_checkpointer() -> AsyncSqliteSaver:
+    """Return the shared SQLite checkpointer, opening it on first use."""
+    global _checkpointer
+    async with _checkpointer_lock:
+        if _checkpointer is None:
+            conn = await aiosqlite.connect(CHECKPOINT_DB_PATH)
+            checkpointer = AsyncSqliteSaver(conn)
+            try:
+                await checkpointer.setup()
+            except BaseException:
+                await conn.close()
+                raise
+            _checkpointer = checkpointer
+    return _checkpointer
+
+
+async def close_checkpointer() -> None:
+    """Close the shared checkpointer's connection, if it was opened."""
+    global _checkpointer
+    async with _checkpointer_lock:
+        if _checkpointer is not None:
+            await _checkpointer.conn.close()
+            _checkpointer = None
+
+
+async def ainvoke_resumable(
+    agent: CompiledStateGraph, thread_id: str, input: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Run an agent on a thread, resuming from the last completed node if a
+    previous run on the same thread failed part way through.
+
+    A thread's checkpoints are deleted once its run completes, so the next
+    run on the same id starts from fresh state instead of inheriting the
+    previous run's channel values.
+    """
+    config = {"configurable": {"thread_id": thread_id}}
+    snapshot = await agent.aget_state(config)
+    if snapshot.next:
+        logger.info(f"Resuming '{thread_id}' from {list(snapshot.next)}")
+        response = await agent.ainvoke(None, config)
+    else:
+        if snapshot.values:
+            # A completed run whose cleanup failed; don't build on its state
+            await agent.checkpointer.adelete_thread(thread_id)
+        response = await agent.ainvoke(input, config)
+
+    try:
+        await agent.checkpointer.adelete_thread(thread_id)
+    except Exception as e:
+        logger.warning(f"Failed to delete checkpoints of '{thread_id}': {e}")
+    return response
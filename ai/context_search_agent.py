@@ -1,4 +1,5 @@
 from langgraph.graph import StateGraph
+from langgraph.graph.state import CompiledStateGraph
 from langgraph.types import Command
 from langchain_ollama import ChatOllama
 from langchain_core.tools import Tool
@@ -8,11 +9,17 @@ from langchain_openai import ChatOpenAI
 from pydantic import BaseModel
 from typing import Annotated, Literal
 from dotenv import load_dotenv
+import logging
 import os
 
 load_dotenv()
 
 from utils import get_openrouter_base_url, get_openrouter_api_key
+from ai.model_router import model_router
+from ai.checkpointer import get_checkpointer
+from executors import run_blocking
+
+logger = logging.getLogger(__name__)
 
 SERPER_API_KEY = os.getenv("SERPER_API_KEY")
 
@@ -35,31 +42,40 @@ class WorkflowState(BaseModel):
     """State for the workflow."""
 
     image_url: Annotated[str, "URL of the image to be processed"]
+    search_keyword: Annotated[
+        str | None, "Keyword describing the real-world topic of the meme"
+    ] = None
+    search_result: Annotated[
+        str | None, "Web search result for the search keyword"
+    ] = None
     context: Annotated[
         str | None,
         "Extra information extracted from the web to better explain the meme image",
     ] = None
 
 
-async def search_context(state: WorkflowState) -> Command[Literal["__end__"]]:
-    """
-    Search for context about the meme image using Google Serper.
-    """
+class SearchKeywordOutput(BaseModel):
+    """Expected output for search keyword generation."""
 
-    class SearchKeywordOutput(BaseModel):
-        """Expected output for search keyword generation."""
+    search_keyword: Annotated[
+        str, "The keyword to search for based on the meme image"
+    ]
 
-        search_keyword: Annotated[
-            str, "The keyword to search for based on the meme image"
-        ]
 
-    # First, generate a search keyword based on the image
-    keyword_llm = ChatOpenAI(
-        base_url=get_openrouter_base_url(),
-        api_key=get_openrouter_api_key(),
-        model="google/gemini-2.0-flash-001",
-        temperature=0.2,
-    ).with_structured_output(SearchKeywordOutput)
+class BengaliTranslationOutput(BaseModel):
+    """Expected output for translation of the search result."""
+
+    translated_to_bengali: Annotated[
+        str, "The search result translated in Bengali"
+    ]
+
+
+async def generate_search_keyword(
+    state: WorkflowState,
+) -> Command[Literal["__end__", "search_node"]]:
+    """
+    Generate a search keyword for the real-world topic the meme image references.
+    """
 
     keyword_prompt = ChatPromptTemplate.from_messages(
         [
@@ -87,31 +103,46 @@ async def search_context(state: WorkflowState) -> Command[Literal["__end__"]]:
         ]
     )
 
-    keyword_chain = keyword_prompt | keyword_llm
-    keyword_response = await keyword_chain.ainvoke({"image_url": state.image_url})
+    def build_keyword_chain(model: str):
+        keyword_llm = ChatOpenAI(
+            base_url=get_openrouter_base_url(),
+            api_key=get_openrouter_api_key(),
+            model=model,
+            temperature=0.2,
+        ).with_structured_output(SearchKeywordOutput)
+        return keyword_prompt | keyword_llm
+
+    keyword_response = await model_router.ainvoke(
+        "keyword", build_keyword_chain, {"image_url": state.image_url}
+    )
 
     if isinstance(keyword_response, SearchKeywordOutput):
-        search_keyword = keyword_response.search_keyword
-        search_result = search.run(search_keyword)
+        return Command(
+            goto="search_node",
+            update={"search_keyword": keyword_response.search_keyword},
+        )
 
-        print("---Search result:----", search_result)
+    return Command(goto="__end__")
 
-        class BengaliTranslationOutput(BaseModel):
-            """Expected output for translation of the search result."""
 
-            translated_to_bengali: Annotated[
-                str, "The search result translated in Bengali"
-            ]
+async def search_context(state: WorkflowState) -> Command[Literal["translator_node"]]:
+    """
+    Search for context about the meme image using Google Serper.
+    """
+    # GoogleSerperAPIWrapper.run is a synchronous HTTP call
+    search_result = await run_blocking(search.run, state.search_keyword)
 
-        # translator_llm = ChatOllama(
-        #     model="qwen2.5vl:7b", temperature=0.1, base_url="http://localhost:11434"
-        # ).with_structured_output(BengaliTranslationOutput)
-        translator_llm = ChatOpenAI(
-            base_url=get_openrouter_base_url(),
-            api_key=get_openrouter_api_key(),
-            model="google/gemini-2.0-flash-001",
-        ).with_structured_output(BengaliTranslationOutput)
-        translator_prompt = ChatPromptTemplate.from_messages(
+    logger.debug("Search result for %r: %s", state.search_keyword, search_result)
+
+    return Command(goto="translator_node", update={"search_result": search_result})
+
+
+async def translate_context(state: WorkflowState) -> Command[Literal["__end__"]]:
+    """
+    Translate the search result into Bengali.
+    """
+
+    translator_prompt = ChatPromptTemplate.from_messages(
         [
             (
                 "system",
@@ -130,28 +161,50 @@ async def search_context(state: WorkflowState) -> Command[Literal["__end__"]]:
             ),
         ]
     )
-        print("Translator prompt:", translator_prompt)
-        translator_chain = translator_prompt | translator_llm
-        translator_response = await translator_chain.ainvoke({"snippet": search_result})
-
-        print("Translator response:", translator_response)
-
-        if isinstance(translator_response, BengaliTranslationOutput):
-            return Command(
-                goto="__end__",
-                update={"context": translator_response.translated_to_bengali},
-            )
-        else:
-            return Command(
-                goto="__end__",
-                update={"context": search_result},
-            )
 
-    return Command(goto="__end__")
+    def build_translator_chain(model: str):
+        # translator_llm = ChatOllama(
+        #     model="qwen2.5vl:7b", temperature=0.1, base_url="http://localhost:11434"
+        # ).with_structured_output(BengaliTranslationOutput)
+        translator_llm = ChatOpenAI(
+            base_url=get_openrouter_base_url(),
+            api_key=get_openrouter_api_key(),
+            model=model,
+        ).with_structured_output(BengaliTranslationOutput)
+        return translator_prompt | translator_llm
+
+    translator_response = await model_router.ainvoke(
+        "translate", build_translator_chain, {"snippet": state.search_result}
+    )
+
+    logger.debug("Translator response: %s", translator_response)
+
+    if isinstance(translator_response, BengaliTranslationOutput):
+        return Command(
+            goto="__end__",
+            update={"context": translator_response.translated_to_bengali},
+        )
+    else:
+        return Command(
+            goto="__end__",
+            update={"context": state.search_result},
+        )
 
 
 workflow = StateGraph(WorkflowState)
-workflow.add_node("search_context_node", search_context)
-workflow.add_edge("__start__", "search_context_node")
+workflow.add_node("keyword_node", generate_search_keyword)
+workflow.add_node("search_node", search_context)
+workflow.add_node("translator_node", translate_context)
+workflow.add_edge("__start__", "keyword_node")
 
 ContextSearchAgent = workflow.compile()
+
+_checkpointed_agent: CompiledStateGraph | None = None
+
+
+async def get_context_search_agent() -> CompiledStateGraph:
+    """ContextSearchAgent compiled with the durable checkpointer, so failed runs can resume."""
+    global _checkpointed_agent
+    if _checkpointed_agent is None:
+        _checkpointed_agent = workflow.compile(checkpointer=await get_checkpointer())
+    return _checkpointed_agent
@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import os
+import time
+from collections import Counter, deque
+from typing import Any, Callable, Dict, List, Tuple
+
+from dotenv import load_dotenv
+from langchain_core.runnables import Runnable
+
+from db.coordination import coordinator
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def _candidates(task: str, default: List[str]) -> List[str]:
+    configured = os.getenv(f"MODEL_ROUTES_{task.upper()}")
+    if not configured:
+        return default
+    return [model.strip() for model in configured.split(",") if model.strip()]
+
+
+# Ordered candidate models per task, overridable with MODEL_ROUTES_<TASK>
+# as a comma-separated list.
+TASK_MODELS = {
+    "ocr": _candidates("ocr", ["google/gemini-2.0-flash-001", "google/gemini-2.5-flash"]),
+    "overview": _candidates("overview", ["google/gemini-2.0-flash-001", "google/gemini-2.5-flash"]),
+    "keyword": _candidates("keyword", ["google/gemini-2.0-flash-001", "google/gemini-2.5-flash"]),
+    "translate": _candidates(
+        "translate", ["deepseek/deepseek-r1-0528:free", "google/gemini-2.0-flash-001"]
+    ),
+}
+MODEL_TIMEOUT_SECONDS = float(os.getenv("MODEL_TIMEOUT_SECONDS", "60"))
+MODEL_STATS_WINDOW = 20
+MODEL_MAX_CONSECUTIVE_FAILURES = 3
+MODEL_COOLDOWN_SECONDS = 30.0
+# Stats only change when a model is called, so a model ranked below the
+# leader would never get a chance to show it recovered. Stats older than
+# this are dropped, which ranks the model as unmeasured and probes it once.
+MODEL_STATS_TTL_SECONDS = float(os.getenv("MODEL_STATS_TTL_SECONDS", "300"))
+LATENCY_EWMA_ALPHA = 0.3
+
+
+class ModelStats:
+    """Rolling latency and error rate of one model on one task."""
+
+    def __init__(self):
+        self.outcomes: deque[bool] = deque(maxlen=MODEL_STATS_WINDOW)
+        self.latency: float | None = None
+        self.consecutive_failures = 0
+        self.last_failure_at = 0.0
+        self.last_sample_at = time.monotonic()
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def is_healthy(self) -> bool:
+        if self.consecutive_failures < MODEL_MAX_CONSECUTIVE_FAILURES:
+            return True
+        return time.monotonic() - self.last_failure_at > MODEL_COOLDOWN_SECONDS
+
+    def record(self, latency: float | None, ok: bool) -> None:
+        """Record a call outcome. Latency is None for errors that say nothing about speed."""
+        self.last_sample_at = time.monotonic()
+        self.outcomes.append(ok)
+        if latency is not None:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += LATENCY_EWMA_ALPHA * (latency - self.latency)
+        if ok:
+            self.consecutive_failures = 0
+        else:
+            self.consecutive_failures += 1
+            self.last_failure_at = time.monotonic()
+
+
+class ModelRouter:
+    """Sends each LLM call to the fastest healthy candidate model for its task,
+    falling back down the list on errors and timeouts."""
+
+    def __init__(
+        self,
+        task_models: Dict[str, List[str]] = TASK_MODELS,
+        timeout_seconds: float = MODEL_TIMEOUT_SECONDS,
+        stats_ttl_seconds: float = MODEL_STATS_TTL_SECONDS,
+    ):
+        self.task_models = task_models
+        self.timeout_seconds = timeout_seconds
+        self.stats_ttl_seconds = stats_ttl_seconds
+        # Keyed by (task, model): a model's latency depends on the prompt and
+        # output size, so OCR timings say nothing about translation.
+        self.stats: Dict[Tuple[str, str], ModelStats] = {}
+        self.routed: Dict[str, Counter] = {task: Counter() for task in task_models}
+        self.fallbacks: Counter = Counter()
+        self.timeouts: Counter = Counter()
+
+    def _stats(self, task: str, model: str) -> ModelStats:
+        stats = self.stats.get((task, model))
+        if stats is None or time.monotonic() - stats.last_sample_at > self.stats_ttl_seconds:
+            stats = self.stats[(task, model)] = ModelStats()
+        return stats
+
+    def rank(self, task: str) -> List[str]:
+        """Candidates ordered healthy first, then mostly-succeeding, then by rolling latency.
+
+        Models without latency samples, or whose stats have expired, rank as
+        fastest so each gets measured (again).
+        """
+        candidates = self.task_models[task]
+
+        def key(item):
+            index, model = item
+            stats = self._stats(task, model)
+            return (
+                not stats.is_healthy(),
+                stats.error_rate >= 0.5,
+                stats.latency or 0.0,
+                index,
+            )
+
+        return [model for _, model in sorted(enumerate(candidates), key=key)]
+
+    async def ainvoke(
+        self, task: str, build: Callable[[str], Runnable], input: Any
+    ) -> Any:
+        """Invoke the runnable built for the best model, falling back on failure."""
+        ranked = self.rank(task)
+        last_error: Exception | None = None
+        for attempt, model in enumerate(ranked):
+            if attempt == 0:
+                self.routed[task][model] += 1
+            else:
+                self.fallbacks[task] += 1
+                logger.warning(f"Falling back to '{model}' for task '{task}'")
+
+            await coordinator.acquire("openrouter")
+            started = time.monotonic()
+            try:
+                response = await asyncio.wait_for(
+                    build(model).ainvoke(input), timeout=self.timeout_seconds
+                )
+            except asyncio.TimeoutError:
+                self._stats(task, model).record(time.monotonic() - started, ok=False)
+                self.timeouts[(task, model)] += 1
+                last_error = TimeoutError(
+                    f"Model '{model}' timed out after {self.timeout_seconds}s"
+                )
+            except Exception as e:
+                self._stats(task, model).record(None, ok=False)
+                last_error = e
+            else:
+                self._stats(task, model).record(time.monotonic() - started, ok=True)
+                return response
+
+            logger.warning(f"Model '{model}' failed for task '{task}': {last_error}")
+
+        raise RuntimeError(
+            f"All models failed for task '{task}': {last_error}"
+        ) from last_error
+
+    def _model_snapshot(self, task: str, model: str) -> Dict[str, Any]:
+        stats = self._stats(task, model)
+        return {
+            "latency_seconds": stats.latency,
+            "error_rate": stats.error_rate,
+            "samples": len(stats.outcomes),
+            "healthy": stats.is_healthy(),
+            "timeouts": self.timeouts[(task, model)],
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Routing metrics per task: candidate ranking, counters and model health."""
+        return {
+            "tasks": {
+                task: {
+                    "ranking": self.rank(task),
+                    "routed": dict(self.routed[task]),
+                    "fallbacks": self.fallbacks[task],
+                    "models": {
+                        model: self._model_snapshot(task, model)
+                        for model in self.task_models[task]
+                    },
+                }
+                for task in self.task_models
+            },
+        }
+
+
+model_router = ModelRouter()
@@ -0,0 +1,408 @@
+import asyncio
+import base64
+import io
+import logging
+import multiprocessing
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from typing import Annotated, List, Tuple
+
+from dotenv import load_dotenv
+from langchain_core.messages import HumanMessage
+from langchain_openai import ChatOpenAI
+from pydantic import BaseModel
+
+from ai.model_router import model_router
+from executors import run_blocking, run_cpu
+from utils import get_openrouter_base_url, get_openrouter_api_key
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+OCR_LOCAL_MIN_CONFIDENCE = float(os.getenv("OCR_LOCAL_MIN_CONFIDENCE", "80"))
+OCR_TESSERACT_LANGS = os.getenv("OCR_TESSERACT_LANGS", "ben+eng")
+OCR_PROCESS_POOL_WORKERS = int(os.getenv("OCR_PROCESS_POOL_WORKERS", str(os.cpu_count() or 1)))
+OCR_BATCH_SIZE = int(os.getenv("OCR_BATCH_SIZE", "8"))
+OCR_BATCH_WAIT_MS = int(os.getenv("OCR_BATCH_WAIT_MS", "50"))
+OCR_PROMPT = "Please extract all text from this image. If the text is in Bengali, preserve the Bengali characters. Return only the extracted text without any additional commentary."
+OCR_BATCH_PROMPT = "Each of the following images is preceded by its index. Please extract all text from every image. If the text is in Bengali, preserve the Bengali characters. Return one result per image with its index and only the extracted text, without any additional commentary."
+
+# Tesseract OSD script names the OCR_TESSERACT_LANGS models can read. When
+# OSD detects any other script in the image, OCR is escalated to the LLM.
+OCR_SUPPORTED_SCRIPTS = {
+    script.strip()
+    for script in os.getenv("OCR_SUPPORTED_SCRIPTS", "Latin,Bengali").split(",")
+    if script.strip()
+}
+
+
+class OCRResult(BaseModel):
+    """Text extracted from a single image."""
+
+    text: str
+    confidence: float
+    backend: str
+    script: str | None = None
+
+
+class OCRBackend(ABC):
+    """A single OCR engine."""
+
+    name: str
+
+    async def is_available(self) -> bool:
+        return True
+
+    @abstractmethod
+    async def extract_text(self, file_content: bytes, file_mime_type: str) -> OCRResult:
+        ...
+
+
+def _tesseract_ocr(
+    file_content: bytes, languages: str, detect_script: bool
+) -> Tuple[str, float, str | None]:
+    """Run Tesseract on an image. Top-level so it can run in a process pool.
+
+    The script is detected from the image with OSD, since the recognized
+    text can only contain scripts of the loaded language models. It is None
+    when detection is disabled or the image has too little text for OSD.
+    """
+    import pytesseract
+    from PIL import Image
+
+    with Image.open(io.BytesIO(file_content)) as image:
+        image = image.convert("RGB")
+        data = pytesseract.image_to_data(
+            image, lang=languages, output_type=pytesseract.Output.DICT
+        )
+        script = None
+        if detect_script:
+            try:
+                osd = pytesseract.image_to_osd(
+                    image, output_type=pytesseract.Output.DICT
+                )
+                script = osd.get("script")
+            except pytesseract.TesseractError:
+                pass
+
+    lines: dict[tuple[int, int, int], list[str]] = {}
+    confidences = []
+    for word, conf, block, par, line in zip(
+        data["text"], data["conf"], data["block_num"], data["par_num"], data["line_num"]
+    ):
+        if not word.strip() or float(conf) < 0:
+            continue
+        lines.setdefault((block, par, line), []).append(word)
+        confidences.append(float(conf))
+
+    text = "\n".join(" ".join(words) for words in lines.values())
+    confidence = sum(confidences) / len(confidences) if confidences else 0.0
+    return text, confidence, script
+
+
+class TesseractOCRBackend(OCRBackend):
+    """Local CPU OCR using Tesseract, run in a process pool."""
+
+    name = "tesseract"
+
+    def __init__(self, languages: str = OCR_TESSERACT_LANGS):
+        self.languages = languages
+        self._available: bool | None = None
+        self._detect_script = False
+
+    def _probe(self) -> bool:
+        try:
+            import pytesseract
+
+            installed = set(pytesseract.get_languages(config=""))
+        except Exception as e:
+            logger.warning(f"Tesseract is not available, local OCR disabled: {e}")
+            return False
+        missing = set(self.languages.split("+")) - installed
+        if missing:
+            logger.warning(
+                f"Tesseract is missing language models {sorted(missing)}, local OCR disabled"
+            )
+        self._detect_script = "osd" in installed
+        if not self._detect_script:
+            logger.warning(
+                "Tesseract OSD model is not installed, images in unsupported scripts "
+                "are escalated only when confidence is low"
+            )
+        return not missing
+
+    async def is_available(self) -> bool:
+        # get_languages runs the tesseract binary, so probe once off the loop
+        if self._available is None:
+            self._available = await run_blocking(self._probe)
+        return self._available
+
+    async def extract_text(self, file_content: bytes, file_mime_type: str) -> OCRResult:
+        loop = asyncio.get_running_loop()
+        text, confidence, script = await loop.run_in_executor(
+            get_process_pool(),
+            _tesseract_ocr,
+            file_content,
+            self.languages,
+            self._detect_script,
+        )
+        return OCRResult(
+            text=text, confidence=confidence, backend=self.name, script=script
+        )
+
+
+def _to_data_url(file_content: bytes, file_mime_type: str) -> str:
+    base64_encoded_data = base64.b64encode(file_content).decode("utf-8")
+    return f"data:{file_mime_type};base64,{base64_encoded_data}"
+
+
+class BatchOCRItem(BaseModel):
+    """Text extracted from one image of a batch."""
+
+    index: Annotated[int, "Index of the image in the request"]
+    text: Annotated[str, "All text extracted from the image"]
+
+
+class BatchOCROutput(BaseModel):
+    """Expected output for multi-image OCR."""
+
+    results: Annotated[list[BatchOCRItem], "One entry per image"]
+
+
+class LLMOCRBackend(OCRBackend):
+    """Remote vision-LLM OCR through OpenRouter.
+
+    Concurrent calls are coalesced by an OCRMicroBatcher into multi-image
+    requests unless batch_size is 1.
+    """
+
+    name = "llm"
+
+    def __init__(
+        self,
+        batch_size: int = OCR_BATCH_SIZE,
+        batch_wait_ms: int = OCR_BATCH_WAIT_MS,
+    ):
+        self.batch_size = batch_size
+        self.batch_wait_ms = batch_wait_ms
+        self._batcher: OCRMicroBatcher | None = None
+
+    def _llm(self, model: str) -> ChatOpenAI:
+        return ChatOpenAI(
+            base_url=get_openrouter_base_url(),
+            api_key=get_openrouter_api_key(),
+            model=model,
+        )
+
+    async def extract_text(self, file_content: bytes, file_mime_type: str) -> OCRResult:
+        if self.batch_size <= 1:
+            return await self.extract_single(file_content, file_mime_type)
+        if self._batcher is None:
+            self._batcher = OCRMicroBatcher(self, self.batch_size, self.batch_wait_ms)
+        return await self._batcher.submit(file_content, file_mime_type)
+
+    async def extract_single(self, file_content: bytes, file_mime_type: str) -> OCRResult:
+        message = HumanMessage(
+            content=[
+                {"type": "text", "text": OCR_PROMPT},
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": await run_cpu(_to_data_url, file_content, file_mime_type)
+                    },
+                },
+            ]
+        )
+
+        llm_response = await model_router.ainvoke("ocr", self._llm, [message])
+        return OCRResult(
+            text=str(llm_response.content), confidence=100.0, backend=self.name
+        )
+
+    async def extract_many(self, images: List[Tuple[bytes, str]]) -> dict[int, str]:
+        """OCR several images in one request. Returns texts keyed by image index."""
+        content: list[str | dict] = [{"type": "text", "text": OCR_BATCH_PROMPT}]
+        for index, (file_content, file_mime_type) in enumerate(images):
+            content.append({"type": "text", "text": f"Image {index}:"})
+            content.append(
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": await run_cpu(_to_data_url, file_content, file_mime_type)
+                    },
+                }
+            )
+
+        response = await model_router.ainvoke(
+            "ocr",
+            lambda model: self._llm(model).with_structured_output(BatchOCROutput),
+            [HumanMessage(content=content)],
+        )
+        if not isinstance(response, BatchOCROutput):
+            raise ValueError(f"Unexpected batch OCR response: {response!r}")
+        return {
+            item.index: item.text
+            for item in response.results
+            if 0 <= item.index < len(images)
+        }
+
+
+class OCRMicroBatcher:
+    """Collects up to max_batch_size images, or waits max_wait_ms, then OCRs them in one request.
+
+    Images missing from a batch response, or a whole batch whose response
+    can't be parsed, fall back to single-image calls.
+    """
+
+    def __init__(self, backend: LLMOCRBackend, max_batch_size: int, max_wait_ms: int):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._pending: list[tuple[bytes, str, asyncio.Future]] = []
+        self._timer: asyncio.Task | None = None
+        self._running: set[asyncio.Task] = set()
+
+    async def submit(self, file_content: bytes, file_mime_type: str) -> OCRResult:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((file_content, file_mime_type, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_after_wait())
+        return await future
+
+    async def _flush_after_wait(self):
+        await asyncio.sleep(self.max_wait_ms / 1000)
+        self._timer = None
+        self._flush()
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._pending:
+            batch = self._pending[: self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size :]
+            task = asyncio.create_task(self._run_batch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run_batch(self, batch: list[tuple[bytes, str, asyncio.Future]]):
+        texts: dict[int, str] = {}
+        if len(batch) > 1:
+            try:
+                texts = await self.backend.extract_many(
+                    [(file_content, file_mime_type) for file_content, file_mime_type, _ in batch]
+                )
+            except Exception as e:
+                logger.warning(
+                    f"Batch OCR of {len(batch)} images failed, falling back to single-image calls: {e}"
+                )
+            else:
+                logger.info(f"Batch OCR returned {len(texts)}/{len(batch)} images")
+
+        async def resolve(index: int, file_content: bytes, file_mime_type: str, future: asyncio.Future):
+            if future.done():
+                return
+            try:
+                if index in texts:
+                    result = OCRResult(
+                        text=texts[index], confidence=100.0, backend=self.backend.name
+                    )
+                else:
+                    result = await self.backend.extract_single(file_content, file_mime_type)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                return
+            if not future.done():
+                future.set_result(result)
+
+        await asyncio.gather(
+            *(
+                resolve(index, file_content, file_mime_type, future)
+                for index, (file_content, file_mime_type, future) in enumerate(batch)
+            )
+        )
+
+
+class OCRService:
+    """Runs the local OCR engine first and escalates to the LLM when it's not good enough."""
+
+    def __init__(
+        self,
+        local_backend: OCRBackend,
+        fallback_backend: OCRBackend,
+        min_confidence: float = OCR_LOCAL_MIN_CONFIDENCE,
+        supported_scripts: set[str] = OCR_SUPPORTED_SCRIPTS,
+    ):
+        self.local_backend = local_backend
+        self.fallback_backend = fallback_backend
+        self.min_confidence = min_confidence
+        self.supported_scripts = supported_scripts
+
+    def fallback_reason(self, result: OCRResult) -> str | None:
+        """Why a local result isn't good enough, or None if it can be used."""
+        if not result.text.strip():
+            return "no text found"
+        if result.confidence < self.min_confidence:
+            return f"confidence {result.confidence:.1f} too low"
+        if result.script is not None and result.script not in self.supported_scripts:
+            return f"unsupported script {result.script}"
+        return None
+
+    async def extract_text(self, file_content: bytes, file_mime_type: str) -> OCRResult:
+        if await self.local_backend.is_available():
+            try:
+                result = await self.local_backend.extract_text(
+                    file_content, file_mime_type
+                )
+                reason = self.fallback_reason(result)
+                if reason is None:
+                    return result
+                logger.info(
+                    f"Local OCR {reason}, escalating to {self.fallback_backend.name}"
+                )
+            except Exception as e:
+                logger.warning(f"Local OCR failed, escalating to {self.fallback_backend.name}: {e}")
+
+        return await self.fallback_backend.extract_text(file_content, file_mime_type)
+
+    async def extract_texts(self, images: List[Tuple[bytes, str]]) -> List[OCRResult]:
+        """OCR many (file_content, file_mime_type) pairs; local work is spread over the process pool."""
+        return await asyncio.gather(
+            *(self.extract_text(content, mime_type) for content, mime_type in images)
+        )
+
+    async def start(self) -> None:
+        """Probe the backends at startup so the first request doesn't pay for it."""
+        await self.local_backend.is_available()
+
+    def shutdown(self) -> None:
+        global _process_pool
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
+
+
+_process_pool: ProcessPoolExecutor | None = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # The server already runs threads (executors, aiosqlite, profiler),
+        # and forking a threaded process can deadlock the child
+        _process_pool = ProcessPoolExecutor(
+            max_workers=OCR_PROCESS_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+    return _process_pool
+
+
+ocr_service = OCRService(
+    local_backend=TesseractOCRBackend(), fallback_backend=LLMOCRBackend()
+)
@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, TypeVar
+from uuid import uuid4
+
+from dotenv import load_dotenv
+from supabase import AsyncClient
+
+from db.config import get_supabase_client
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+COORDINATION_BACKEND = os.getenv("COORDINATION_BACKEND", "postgres")
+# Leases are renewed every third of the TTL while their work runs, so the
+# TTL only bounds how long a crashed worker's lease blocks others.
+COORDINATION_LEASE_TTL_SECONDS = float(os.getenv("COORDINATION_LEASE_TTL_SECONDS", "300"))
+COORDINATION_POLL_INTERVAL_SECONDS = 0.5
+
+# Requests per second allowed across all workers, per dependency. Only
+# Supabase Storage (uploads, downloads, signed URLs) is limited; table
+# queries go through PostgREST and are not counted.
+RATE_LIMITS = {
+    "openrouter": float(os.getenv("RATE_LIMIT_OPENROUTER_PER_SECOND", "10")),
+    "supabase-storage": float(
+        os.getenv("RATE_LIMIT_SUPABASE_STORAGE_PER_SECOND", "100")
+    ),
+}
+
+
+class CoordinationBackend(ABC):
+    """Shared state behind global rate limits and single-flight leases."""
+
+    @abstractmethod
+    async def acquire_tokens(self, bucket: str, rate: float, capacity: float) -> float:
+        """Take one token from a bucket. Returns 0 on success, else seconds to wait."""
+
+    @abstractmethod
+    async def try_claim(self, key: str, owner: str, ttl_seconds: float) -> bool:
+        """Claim a lease on key unless another owner holds an unexpired one."""
+
+    @abstractmethod
+    async def release(self, key: str, owner: str) -> None:
+        """Release a lease held by owner."""
+
+
+class InMemoryCoordinationBackend(CoordinationBackend):
+    """Single-process backend, for local development and tests."""
+
+    def __init__(self):
+        self._buckets: Dict[str, tuple[float, float]] = {}
+        self._leases: Dict[str, tuple[str, float]] = {}
+
+    async def acquire_tokens(self, bucket: str, rate: float, capacity: float) -> float:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(bucket, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated_at) * rate)
+        if tokens >= 1:
+            self._buckets[bucket] = (tokens - 1, now)
+            return 0.0
+        self._buckets[bucket] = (tokens, now)
+        return (1 - tokens) / rate
+
+    async def try_claim(self, key: str, owner: str, ttl_seconds: float) -> bool:
+        now = time.monotonic()
+        lease = self._leases.get(key)
+        if lease and lease[0] != owner and lease[1] > now:
+            return False
+        self._leases[key] = (owner, now + ttl_seconds)
+        return True
+
+    async def release(self, key: str, owner: str) -> None:
+        lease = self._leases.get(key)
+        if lease and lease[0] == owner:
+            del self._leases[key]
+
+
+class PostgresCoordinationBackend(CoordinationBackend):
+    """Backend shared by every worker, using the functions in db/sql/coordination.sql."""
+
+    def __init__(self):
+        self._client: AsyncClient | None = None
+
+    async def _supabase(self) -> AsyncClient:
+        if self._client is None:
+            self._client = await get_supabase_client()
+        return self._client
+
+    async def acquire_tokens(self, bucket: str, rate: float, capacity: float) -> float:
+        supabase = await self._supabase()
+        response = await supabase.rpc(
+            "acquire_rate_token",
+            {"p_bucket": bucket, "p_rate": rate, "p_capacity": capacity},
+        ).execute()
+        return float(response.data or 0)
+
+    async def try_claim(self, key: str, owner: str, ttl_seconds: float) -> bool:
+        supabase = await self._supabase()
+        response = await supabase.rpc(
+            "try_claim_lease",
+            {"p_key": key, "p_owner": owner, "p_ttl_seconds": ttl_seconds},
+        ).execute()
+        return bool(response.data)
+
+    async def release(self, key: str, owner: str) -> None:
+        supabase = await self._supabase()
+        await supabase.rpc(
+            "release_lease", {"p_key": key, "p_owner": owner}
+        ).execute()
+
+
+class Coordinator:
+    """Global token-bucket rate limits and single-flight execution by key.
+
+    Backend errors are logged and treated as permission to proceed, so an
+    unavailable coordination store degrades to per-worker behaviour rather
+    than failing uploads.
+    """
+
+    def __init__(
+        self,
+        backend: CoordinationBackend,
+        rate_limits: Dict[str, float] = RATE_LIMITS,
+        lease_ttl_seconds: float = COORDINATION_LEASE_TTL_SECONDS,
+    ):
+        self.backend = backend
+        self.rate_limits = rate_limits
+        self.lease_ttl_seconds = lease_ttl_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4()}"
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def acquire(self, dependency: str) -> None:
+        """Wait until the global rate limit for a dependency allows one more call."""
+        rate = self.rate_limits.get(dependency)
+        if not rate:
+            return
+        while True:
+            try:
+                wait = await self.backend.acquire_tokens(dependency, rate, rate)
+            except Exception as e:
+                logger.warning(f"Rate limit check for '{dependency}' failed, proceeding: {e}")
+                return
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    async def single_flight(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        """Run func once per key at a time across all workers.
+
+        Callers in this process share the in-flight result. Callers in other
+        workers wait for the lease and then run func themselves, so func must
+        re-check whether the work is already done.
+        """
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            await self._claim(key)
+            heartbeat = asyncio.create_task(self._heartbeat(key))
+            try:
+                result = await func()
+            finally:
+                heartbeat.cancel()
+                await self._release(key)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception retrieved when nobody else awaited it
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _claim(self, key: str) -> None:
+        while True:
+            try:
+                if await self.backend.try_claim(key, self.owner, self.lease_ttl_seconds):
+                    return
+            except Exception as e:
+                logger.warning(f"Lease claim for '{key}' failed, proceeding: {e}")
+                return
+            await asyncio.sleep(COORDINATION_POLL_INTERVAL_SECONDS)
+
+    async def _heartbeat(self, key: str) -> None:
+        """Keep renewing the lease on key until cancelled."""
+        while True:
+            await asyncio.sleep(self.lease_ttl_seconds / 3)
+            try:
+                if not await self.backend.try_claim(key, self.owner, self.lease_ttl_seconds):
+                    logger.warning(f"Lease on '{key}' was taken over by another worker")
+            except Exception as e:
+                logger.warning(f"Lease renewal for '{key}' failed: {e}")
+
+    async def _release(self, key: str) -> None:
+        try:
+            await self.backend.release(key, self.owner)
+        except Exception as e:
+            logger.warning(f"Lease release for '{key}' failed: {e}")
+
+
+def create_coordination_backend(name: str = COORDINATION_BACKEND) -> CoordinationBackend:
+    if name == "memory":
+        return InMemoryCoordinationBackend()
+    if name == "postgres":
+        return PostgresCoordinationBackend()
+    raise ValueError(f"Unknown coordination backend '{name}'. Use 'memory' or 'postgres'.")
+
+
+coordinator = Coordinator(create_coordination_backend())
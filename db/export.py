@@ -0,0 +1,235 @@
+"""
+Incremental export of annotated_memes to a local Parquet dataset.
+
+Each run reads rows changed since the stored watermark by keyset on
+(updated_at, image_id), writes them as one new partition, and advances
+the watermark. A row changed again later appears in a newer partition;
+compaction keeps only the latest version of each image_id.
+
+updated_at is the transaction start time, so a slow transaction can
+commit a row older than rows already visible. Only rows older than
+EXPORT_SAFETY_LAG_SECONDS are exported, which keeps the watermark
+behind any transaction still in flight.
+
+A lock file in the export directory lets only one export (API or CLI)
+run at a time, since concurrent runs would share a watermark and delete
+each other's partitions while compacting.
+
+Usage: python -m db.export [--compact]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import fcntl
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+from supabase import AsyncClient
+
+from db.config import get_supabase_client
+from executors import run_cpu
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = Path(os.getenv("EXPORT_DIR", "exports/annotated_memes"))
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))
+EXPORT_COMPACT_THRESHOLD = int(os.getenv("EXPORT_COMPACT_THRESHOLD", "24"))
+EXPORT_SAFETY_LAG_SECONDS = int(os.getenv("EXPORT_SAFETY_LAG_SECONDS", "300"))
+WATERMARK_FILE = "_watermark.json"
+LOCK_FILE = "_export.lock"
+
+SCHEMA = pa.schema(
+    [
+        ("image_id", pa.string()),
+        ("file_name", pa.string()),
+        ("ocr_text", pa.string()),
+        ("explanation", pa.string()),
+        ("genre", pa.string()),
+        ("heroes", pa.list_(pa.string())),
+        ("villains", pa.list_(pa.string())),
+        ("victims", pa.list_(pa.string())),
+        ("other_roles", pa.list_(pa.string())),
+        ("sentiment", pa.string()),
+        ("context", pa.string()),
+        ("annotation_status", pa.string()),
+        ("updated_at", pa.timestamp("us", tz="UTC")),
+    ]
+)
+
+
+class ExportInProgressError(RuntimeError):
+    """Another export holds the lock on the export directory."""
+
+
+@contextlib.contextmanager
+def export_lock(export_dir: Path):
+    """Hold an exclusive lock on the export directory, failing fast if it's taken."""
+    with open(export_dir / LOCK_FILE, "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise ExportInProgressError(
+                f"Another export of {export_dir} is already running"
+            ) from None
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_watermark(export_dir: Path) -> Dict[str, str] | None:
+    path = export_dir / WATERMARK_FILE
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def write_watermark(export_dir: Path, updated_at: str, image_id: str) -> None:
+    path = export_dir / WATERMARK_FILE
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps({"updated_at": updated_at, "image_id": image_id}))
+    os.replace(tmp_path, path)
+
+
+async def fetch_page(
+    supabase: AsyncClient, watermark: Dict[str, str] | None, cutoff: datetime
+) -> List[Dict[str, Any]]:
+    """Fetch the next (updated_at, image_id) page between the watermark and the cutoff."""
+    query = (
+        supabase.table("annotated_memes")
+        .select(", ".join(SCHEMA.names))
+        .lt("updated_at", cutoff.isoformat())
+    )
+    if watermark:
+        updated_at = watermark["updated_at"]
+        query = query.or_(
+            f'updated_at.gt."{updated_at}",'
+            f'and(updated_at.eq."{updated_at}",image_id.gt.{watermark["image_id"]})'
+        )
+    response = (
+        await query.order("updated_at")
+        .order("image_id")
+        .limit(EXPORT_PAGE_SIZE)
+        .execute()
+    )
+    return response.data
+
+
+def rows_to_table(rows: List[Dict[str, Any]]) -> pa.Table:
+    for row in rows:
+        row["updated_at"] = datetime.fromisoformat(row["updated_at"])
+    return pa.Table.from_pylist(rows, schema=SCHEMA)
+
+
+def list_partitions(export_dir: Path) -> List[Path]:
+    return sorted(export_dir.glob("*.parquet"))
+
+
+def partition_name(prefix: str) -> str:
+    return f"{prefix}-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')}.parquet"
+
+
+def compact(export_dir: Path = EXPORT_DIR) -> Path | None:
+    """Merge all partitions into one, keeping the latest version of each image_id."""
+    partitions = list_partitions(export_dir)
+    if len(partitions) <= 1:
+        return None
+
+    table = pa.concat_tables(pq.read_table(path, schema=SCHEMA) for path in partitions)
+    table = table.sort_by([("image_id", "ascending"), ("updated_at", "descending")])
+    image_ids = table.column("image_id").combine_chunks()
+    # Sorted by image_id, so the first row of each run is its latest version
+    is_first = pc.not_equal(image_ids.slice(1), image_ids.slice(0, len(image_ids) - 1))
+    keep = pa.concat_arrays([pa.array([True]), is_first.fill_null(True)])
+    table = table.filter(keep).sort_by([("updated_at", "ascending"), ("image_id", "ascending")])
+
+    path = export_dir / partition_name("compacted")
+    tmp_path = path.with_suffix(".tmp")
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+    for partition in partitions:
+        partition.unlink()
+
+    logger.info(f"Compacted {len(partitions)} partitions into {path.name} ({table.num_rows} rows)")
+    return path
+
+
+async def export_annotated_memes(
+    export_dir: Path = EXPORT_DIR, force_compact: bool = False
+) -> Dict[str, Any]:
+    """Export rows changed since the last run as a new Parquet partition."""
+    export_dir.mkdir(parents=True, exist_ok=True)
+    with export_lock(export_dir):
+        return await _export(export_dir, force_compact)
+
+
+async def _export(export_dir: Path, force_compact: bool) -> Dict[str, Any]:
+    """Export and compact; the caller holds the export lock."""
+    supabase = await get_supabase_client()
+    watermark = read_watermark(export_dir)
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=EXPORT_SAFETY_LAG_SECONDS)
+
+    path = export_dir / partition_name("part")
+    tmp_path = path.with_suffix(".tmp")
+    writer: pq.ParquetWriter | None = None
+    exported = 0
+    try:
+        while True:
+            rows = await fetch_page(supabase, watermark, cutoff)
+            if not rows:
+                break
+            last = rows[-1]
+            watermark = {"updated_at": last["updated_at"], "image_id": last["image_id"]}
+
+            table = await run_cpu(rows_to_table, rows)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, SCHEMA)
+            await run_cpu(writer.write_table, table)
+            exported += len(rows)
+            if len(rows) < EXPORT_PAGE_SIZE:
+                break
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+    if writer is not None:
+        writer.close()
+
+    if exported:
+        os.replace(tmp_path, path)
+        write_watermark(export_dir, watermark["updated_at"], watermark["image_id"])
+        logger.info(f"Exported {exported} rows to {path.name}")
+
+    compacted = None
+    if force_compact or len(list_partitions(export_dir)) > EXPORT_COMPACT_THRESHOLD:
+        compacted = await run_cpu(compact, export_dir)
+
+    return {
+        "exported_rows": exported,
+        "partition": path.name if exported else None,
+        "compacted_into": compacted.name if compacted else None,
+        "watermark": watermark,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--compact", action="store_true", help="Compact partitions after exporting"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(asyncio.run(export_annotated_memes(force_compact=args.compact)), indent=2))
@@ -0,0 +1,205 @@
+import io
+import logging
+import os
+from typing import Dict, List, Tuple
+
+from dotenv import load_dotenv
+from PIL import Image, ImageChops
+from supabase import AsyncClient
+
+from db.coordination import coordinator
+from executors import run_cpu
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", "6"))
+PHASH_REBUILD_PAGE_SIZE = 1000
+HASH_SIZE = 8
+# The 64-bit hash only finds candidates: memes sharing a template but with
+# different captions hash (nearly) the same. A candidate is reused only if
+# its image also matches pixel by pixel at CONFIRM_SIZE, where recompression
+# and rescaling move no pixel by more than CONFIRM_PIXEL_DELTA but a changed
+# caption moves many.
+CONFIRM_SIZE = 64
+CONFIRM_PIXEL_DELTA = 48
+PHASH_CONFIRM_MAX_CHANGED = float(os.getenv("PHASH_CONFIRM_MAX_CHANGED", "0.002"))
+
+
+def compute_phash(file_content: bytes) -> str:
+    """Compute a 64-bit difference hash (dHash) of an image, returned as hex."""
+    with Image.open(io.BytesIO(file_content)) as image:
+        image.draft("L", (HASH_SIZE * 4, HASH_SIZE * 4))
+        pixels = (
+            image.convert("L")
+            .resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS)
+            .tobytes()
+        )
+
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f"{value:016x}"
+
+
+def _confirm_thumbnail(file_content: bytes) -> Image.Image:
+    with Image.open(io.BytesIO(file_content)) as image:
+        image.draft("L", (CONFIRM_SIZE * 2, CONFIRM_SIZE * 2))
+        return image.convert("L").resize(
+            (CONFIRM_SIZE, CONFIRM_SIZE), Image.Resampling.BOX
+        )
+
+
+def images_match(a: bytes, b: bytes, max_changed: float = PHASH_CONFIRM_MAX_CHANGED) -> bool:
+    """Whether two images differ only by encoding and scale, not by content such as captions."""
+    diff = ImageChops.difference(_confirm_thumbnail(a), _confirm_thumbnail(b)).tobytes()
+    changed = sum(value > CONFIRM_PIXEL_DELTA for value in diff)
+    return changed <= max_changed * len(diff)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """BK-tree over 64-bit hashes for Hamming-distance radius queries."""
+
+    def __init__(self):
+        # Each node is [hash, image_ids, {distance: child_node}]
+        self._root: list | None = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, value: int, image_id: str) -> None:
+        self._size += 1
+        if self._root is None:
+            self._root = [value, [image_id], {}]
+            return
+
+        node = self._root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                if image_id not in node[1]:
+                    node[1].append(image_id)
+                else:
+                    self._size -= 1
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [image_id], {}]
+                return
+            node = child
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, str]]:
+        """Return (distance, image_id) pairs within max_distance, nearest first."""
+        if self._root is None:
+            return []
+
+        matches = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(value, node[0])
+            if distance <= max_distance:
+                matches.extend((distance, image_id) for image_id in node[1])
+            low, high = distance - max_distance, distance + max_distance
+            for child_distance, child in node[2].items():
+                if low <= child_distance <= high:
+                    stack.append(child)
+
+        matches.sort()
+        return matches
+
+
+class PhashIndex:
+    """In-process near-duplicate index mapping perceptual hashes to image ids."""
+
+    def __init__(self, max_distance: int = PHASH_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self._tree = BKTree()
+
+    def __len__(self) -> int:
+        return len(self._tree)
+
+    def add(self, phash: str, image_id: str) -> None:
+        self._tree.add(int(phash, 16), image_id)
+
+    def find_near_duplicates(self, phash: str) -> List[Tuple[int, str]]:
+        return self._tree.search(int(phash, 16), self.max_distance)
+
+    async def rebuild(self, supabase: AsyncClient) -> int:
+        """Rebuild the index from every hashed row in annotated_memes."""
+        tree = BKTree()
+        start = 0
+        while True:
+            response = (
+                await supabase.table("annotated_memes")
+                .select("image_id, phash")
+                .not_.is_("phash", "null")
+                .order("image_id")
+                .range(start, start + PHASH_REBUILD_PAGE_SIZE - 1)
+                .execute()
+            )
+            for row in response.data:
+                tree.add(int(row["phash"], 16), row["image_id"])
+            if len(response.data) < PHASH_REBUILD_PAGE_SIZE:
+                break
+            start += PHASH_REBUILD_PAGE_SIZE
+
+        self._tree = tree
+        logger.info(f"Rebuilt perceptual hash index with {len(tree)} entries")
+        return len(tree)
+
+
+REUSABLE_COLUMNS = [
+    "ocr_text",
+    "explanation",
+    "genre",
+    "heroes",
+    "villains",
+    "victims",
+    "other_roles",
+    "sentiment",
+    "context",
+    "annotation_status",
+]
+
+phash_index = PhashIndex()
+
+
+async def confirm_near_duplicate(
+    supabase: AsyncClient, file_content: bytes, image_id: str
+) -> bool:
+    """Compare an upload against a candidate's stored image; unverifiable means no match."""
+    try:
+        await coordinator.acquire("supabase-storage")
+        candidate = await supabase.storage.from_("memes").download(image_id)
+        return await run_cpu(images_match, file_content, candidate)
+    except Exception as e:
+        logger.warning(f"Could not confirm near-duplicate '{image_id}': {e}")
+        return False
+
+
+async def find_reusable_annotations(
+    supabase: AsyncClient, phash: str, file_content: bytes
+) -> Dict[str, object] | None:
+    """Return the OCR text and annotations of the closest confirmed near-duplicate, if any."""
+    for _, image_id in phash_index.find_near_duplicates(phash):
+        response = (
+            await supabase.table("annotated_memes")
+            .select(", ".join(["image_id", *REUSABLE_COLUMNS]))
+            .eq("image_id", image_id)
+            .execute()
+        )
+        if not response.data or not response.data[0].get("ocr_text"):
+            continue
+        if await confirm_near_duplicate(supabase, file_content, image_id):
+            return response.data[0]
+        logger.info(f"Near-duplicate '{image_id}' differs in content, not reusing it")
+    return None
@@ -0,0 +1,66 @@
+-- Shared state for db/coordination.py: global token buckets and
+-- single-flight leases, called through PostgREST RPC.
+
+create table if not exists coordination_buckets (
+    bucket text primary key,
+    tokens double precision not null,
+    updated_at timestamptz not null
+);
+
+create or replace function acquire_rate_token(
+    p_bucket text, p_rate double precision, p_capacity double precision
+) returns double precision
+language plpgsql as $$
+declare
+    v_now timestamptz := clock_timestamp();
+    v_tokens double precision;
+begin
+    insert into coordination_buckets (bucket, tokens, updated_at)
+    values (p_bucket, p_capacity, v_now)
+    on conflict (bucket) do nothing;
+
+    select least(p_capacity, tokens + extract(epoch from (v_now - updated_at)) * p_rate)
+    into v_tokens
+    from coordination_buckets
+    where bucket = p_bucket
+    for update;
+
+    if v_tokens >= 1 then
+        update coordination_buckets
+        set tokens = v_tokens - 1, updated_at = v_now
+        where bucket = p_bucket;
+        return 0;
+    end if;
+
+    update coordination_buckets
+    set tokens = v_tokens, updated_at = v_now
+    where bucket = p_bucket;
+    return (1 - v_tokens) / p_rate;
+end;
+$$;
+
+create table if not exists coordination_leases (
+    key text primary key,
+    owner text not null,
+    expires_at timestamptz not null
+);
+
+create or replace function try_claim_lease(
+    p_key text, p_owner text, p_ttl_seconds double precision
+) returns boolean
+language plpgsql as $$
+begin
+    insert into coordination_leases (key, owner, expires_at)
+    values (p_key, p_owner, clock_timestamp() + make_interval(secs => p_ttl_seconds))
+    on conflict (key) do update
+    set owner = excluded.owner, expires_at = excluded.expires_at
+    where coordination_leases.owner = excluded.owner
+       or coordination_leases.expires_at < clock_timestamp();
+    return found;
+end;
+$$;
+
+create or replace function release_lease(p_key text, p_owner text) returns void
+language sql as $$
+    delete from coordination_leases where key = p_key and owner = p_owner;
+$$;
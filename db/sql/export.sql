@@ -0,0 +1,21 @@
+-- Change tracking for db/export.py: updated_at is bumped on every update
+-- and (updated_at, image_id) is the export keyset. now() is the transaction
+-- start time, so the export only reads rows older than a safety lag.
+alter table annotated_memes
+    add column if not exists updated_at timestamptz not null default now();
+
+create or replace function set_updated_at() returns trigger
+language plpgsql as $$
+begin
+    new.updated_at := now();
+    return new;
+end;
+$$;
+
+drop trigger if exists annotated_memes_set_updated_at on annotated_memes;
+create trigger annotated_memes_set_updated_at
+    before update on annotated_memes
+    for each row execute function set_updated_at();
+
+create index if not exists annotated_memes_updated_at_image_id_idx
+    on annotated_memes (updated_at, image_id);
@@ -0,0 +1,3 @@
+-- Perceptual hash of each uploaded meme, used for near-duplicate reuse.
+alter table annotated_memes add column if not exists phash text;
+create index if not exists annotated_memes_phash_idx on annotated_memes (phash);
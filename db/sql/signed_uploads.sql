@@ -0,0 +1,12 @@
+-- When a signed upload was reserved and confirmed. The upload sweep in
+-- main.py expires rows still 'pending_upload' long after reservation and
+-- re-queues rows still 'uploading' long after confirmation.
+alter table annotated_memes
+    add column if not exists upload_reserved_at timestamptz,
+    add column if not exists upload_confirmed_at timestamptz;
+create index if not exists annotated_memes_uploading_confirmed_at_idx
+    on annotated_memes (upload_confirmed_at)
+    where annotation_status = 'uploading';
+create index if not exists annotated_memes_pending_reserved_at_idx
+    on annotated_memes (upload_reserved_at)
+    where annotation_status = 'pending_upload';
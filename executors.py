@@ -0,0 +1,98 @@
+import asyncio
+import functools
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, TypeVar
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+BLOCKING_IO_WORKERS = int(os.getenv("BLOCKING_IO_WORKERS", "16"))
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 1)))
+LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("LOOP_LAG_INTERVAL_SECONDS", "0.5"))
+LOOP_LAG_WARN_SECONDS = float(os.getenv("LOOP_LAG_WARN_SECONDS", "0.1"))
+BLOCKING_IO_THREAD_PREFIX = "blocking-io"
+CPU_THREAD_PREFIX = "cpu"
+
+# Separate pools so slow network calls can't starve CPU-bound work and vice versa.
+blocking_io_executor = ThreadPoolExecutor(
+    max_workers=BLOCKING_IO_WORKERS, thread_name_prefix=BLOCKING_IO_THREAD_PREFIX
+)
+cpu_executor = ThreadPoolExecutor(
+    max_workers=CPU_WORKERS, thread_name_prefix=CPU_THREAD_PREFIX
+)
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking I/O call (sync HTTP clients, file reads) off the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(
+        blocking_io_executor, functools.partial(func, *args, **kwargs)
+    )
+
+
+async def run_cpu(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a CPU-bound call (encoding, image decoding) off the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(
+        cpu_executor, functools.partial(func, *args, **kwargs)
+    )
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes a sleeping task, and warns when it's too late."""
+
+    def __init__(
+        self,
+        interval_seconds: float = LOOP_LAG_INTERVAL_SECONDS,
+        warn_seconds: float = LOOP_LAG_WARN_SECONDS,
+    ):
+        self.interval_seconds = interval_seconds
+        self.warn_seconds = warn_seconds
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.samples = 0
+        self.warnings = 0
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval_seconds)
+            lag = time.perf_counter() - started - self.interval_seconds
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self.samples += 1
+            if lag > self.warn_seconds:
+                self.warnings += 1
+                logger.warning(f"Event loop lag {lag * 1000:.1f}ms exceeds {self.warn_seconds * 1000:.0f}ms")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "last_lag_seconds": self.last_lag,
+            "max_lag_seconds": self.max_lag,
+            "samples": self.samples,
+            "warnings": self.warnings,
+            "warn_seconds": self.warn_seconds,
+        }
+
+
+loop_lag_monitor = LoopLagMonitor()
@@ -1,27 +1,79 @@
-import base64
 import os
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from langchain_ollama import ChatOllama
-from langchain_core.messages import HumanMessage
 from supabase import AsyncClient
 from db.config import get_supabase_client
 from uuid import uuid4
+from datetime import datetime, timedelta, timezone
 import asyncio
+import json
 import logging
 from typing import List, Dict, Any
 from pathlib import Path
+from contextlib import asynccontextmanager
 from routes.annotation.annotation import router as annotation_router
-from langchain_openai import ChatOpenAI
-from pydantic import SecretStr
-from utils import get_openrouter_base_url, get_openrouter_api_key
+from routes.admin.admin import router as admin_router
+from profiling import ProfilerMiddleware
+from executors import loop_lag_monitor, run_cpu
+from pydantic import BaseModel, SecretStr
+from ai.checkpointer import close_checkpointer
+from ai.model_router import model_router
+from ai.ocr_service import ocr_service
+from db.coordination import coordinator
+from db.phash_index import phash_index, compute_phash, find_reusable_annotations
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
-app = FastAPI()
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers that parse fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+log_handler = logging.StreamHandler()
+if os.getenv("LOG_FORMAT", "text").lower() == "json":
+    log_handler.setFormatter(JsonLogFormatter())
+else:
+    log_handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    )
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), handlers=[log_handler])
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    loop_lag_monitor.start()
+    try:
+        supabase = await get_supabase_client()
+        await phash_index.rebuild(supabase)
+    except Exception as e:
+        logger.error(f"Failed to rebuild perceptual hash index: {e}")
+    await ocr_service.start()
+    upload_sweeper = asyncio.create_task(sweep_stale_uploads())
+    try:
+        yield
+    finally:
+        upload_sweeper.cancel()
+        ocr_service.shutdown()
+        await close_checkpointer()
+        await loop_lag_monitor.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -29,16 +81,23 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(ProfilerMiddleware)
 app.include_router(annotation_router)
-
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+app.include_router(admin_router)
 
 MAX_FILES_PER_BATCH = 2500
 MAX_FILE_SIZE = 10 * 1024 * 1024
 MAX_CONCURRENT_UPLOADS = 50
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
 ALLOWED_MIME_TYPES = {"image/jpeg", "image/png", "image/gif", "image/webp"}
+ANNOTATED_STATUSES = {"half_annotated", "fully_annotated"}
+# Confirmed uploads still 'uploading' after this long are assumed lost
+# (e.g. the worker restarted) and re-queued by the sweep.
+UPLOAD_STALE_SECONDS = int(os.getenv("UPLOAD_STALE_SECONDS", "600"))
+UPLOAD_SWEEP_INTERVAL_SECONDS = int(os.getenv("UPLOAD_SWEEP_INTERVAL_SECONDS", "300"))
+# Reservations never confirmed within this long are expired by the sweep.
+# Supabase signed upload URLs are valid for two hours.
+PENDING_UPLOAD_TTL_SECONDS = int(os.getenv("PENDING_UPLOAD_TTL_SECONDS", "10800"))
 
 
 @app.get("/")
@@ -47,56 +106,47 @@ async def root():
 
 
 async def extract_ocr_text_from_image(file_content: bytes, file_mime_type: str):
-    base64_encoded_data = base64.b64encode(file_content).decode("utf-8")
-    data_url = f"data:{file_mime_type};base64,{base64_encoded_data}"
-    # llm = ChatOllama(
-    #     model="qwen2.5vl:7b", temperature=0.1, base_url="http://localhost:11434"
-    # )
-    # llm = ChatGoogleGenerativeAI(
-    #     model="gemini-2.0-flash",
-    #     temperature=0.1,
-    # )
-    llm = ChatOpenAI(
-        base_url=get_openrouter_base_url(),
-        api_key=get_openrouter_api_key(),
-        model="google/gemini-2.0-flash-001"
-    )
+    result = await ocr_service.extract_text(file_content, file_mime_type)
+    logger.info(f"OCR served by '{result.backend}' backend")
+    return result.text
 
-    message = HumanMessage(
-        content=[
-            {
-                "type": "text",
-                "text": "Please extract all text from this image. If the text is in Bengali, preserve the Bengali characters. Return only the extracted text without any additional commentary.",
-            },
-            {"type": "image_url", "image_url": {"url": data_url}},
-        ]
-    )
-
-    llm_response = await llm.ainvoke([message])
 
-    return llm_response.content
+async def compute_file_phash(file_name: str, file_content: bytes) -> str | None:
+    """Compute the perceptual hash of an upload, or None if it can't be decoded."""
+    try:
+        return await run_cpu(compute_phash, file_content)
+    except Exception as e:
+        logger.warning(f"Failed to compute perceptual hash for '{file_name}': {e}")
+        return None
 
 
 def validate_file(file: UploadFile) -> Dict[str, Any]:
     """Validate individual file before processing."""
+    return validate_file_metadata(file.filename, file.content_type, file.size)
+
+
+def validate_file_metadata(
+    file_name: str | None, content_type: str | None, size: int | None
+) -> Dict[str, Any]:
+    """Validate a file's name, MIME type and size."""
     errors = []
 
-    if not file.filename:
+    if not file_name:
         errors.append("File name is required")
 
-    if file.filename:
-        file_ext = Path(file.filename).suffix.lower()
+    if file_name:
+        file_ext = Path(file_name).suffix.lower()
         if file_ext not in ALLOWED_EXTENSIONS:
             errors.append(
                 f"File extension '{file_ext}' not allowed. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
             )
 
-        if file.content_type and file.content_type not in ALLOWED_MIME_TYPES:
-            errors.append(f"MIME type '{file.content_type}' not allowed")
+        if content_type and content_type not in ALLOWED_MIME_TYPES:
+            errors.append(f"MIME type '{content_type}' not allowed")
 
-    if file.size and file.size > MAX_FILE_SIZE:
+    if size and size > MAX_FILE_SIZE:
         errors.append(
-            f"File size {file.size} exceeds maximum allowed size of {MAX_FILE_SIZE} bytes"
+            f"File size {size} exceeds maximum allowed size of {MAX_FILE_SIZE} bytes"
         )
 
     return {"valid": len(errors) == 0, "errors": errors}
@@ -141,14 +191,40 @@ async def check_file_status(supabase: AsyncClient, file_name: str) -> Dict[str,
         raise RuntimeError(f"Failed to check file status: {e}") from e
 
 
+async def build_ocr_fields(
+    file_content: bytes, file_mime_type: str, reused: Dict[str, Any] | None
+) -> Dict[str, Any]:
+    """Return the OCR text for a meme, or the OCR text and annotations of its near-duplicate."""
+    if reused:
+        return {
+            column: value
+            for column, value in reused.items()
+            if column not in ("image_id", "annotation_status")
+        }
+    return {"ocr_text": await extract_ocr_text_from_image(file_content, file_mime_type)}
+
+
+def resolve_success_status(reused: Dict[str, Any] | None) -> str:
+    """Status for a successful upload, keeping a near-duplicate's annotated status."""
+    if reused and reused.get("annotation_status") in ANNOTATED_STATUSES:
+        return reused["annotation_status"]
+    return "uploaded"
+
+
 async def create_or_update_db_record(
     supabase: AsyncClient,
     file_name: str,
     file_content: bytes,
     file_mime_type: str,
     image_id: str | None = None,
+    phash: str | None = None,
+    reused: Dict[str, Any] | None = None,
 ) -> str:
-    """Create new record or update existing record with 'uploading' status."""
+    """Create new record or update existing record with 'uploading' status.
+
+    When `reused` holds the row of a near-duplicate meme, its OCR text and
+    annotations are copied instead of running OCR again.
+    """
     try:
         if not image_id:
             image_id = str(uuid4())
@@ -161,23 +237,31 @@ async def create_or_update_db_record(
                     "annotation_status": "uploading",
                     "uploaded_meme_url": None,
                     "err_msg": None,
+                    "phash": phash,
                 }
             )
             .eq("image_id", image_id)
             .execute()
         )
 
-        ocr_text = await extract_ocr_text_from_image(file_content, file_mime_type)
+        ocr_fields = await build_ocr_fields(file_content, file_mime_type, reused)
 
-        # If no rows updated, create new record
-        if not update_response.data:
+        if update_response.data:
+            # Existing record: store the OCR text (or the near-duplicate's
+            # annotations) so its final status matches what was written
+            await supabase.table("annotated_memes").update(ocr_fields).eq(
+                "image_id", image_id
+            ).execute()
+        else:
+            # No rows updated, create new record
             data = {
                 "image_id": image_id,
                 "file_name": file_name,
                 "annotation_status": "uploading",
                 "uploaded_meme_url": None,
                 "err_msg": None,
-                "ocr_text": ocr_text,
+                "phash": phash,
+                **ocr_fields,
             }
             await supabase.table("annotated_memes").insert(data).execute()
 
@@ -187,7 +271,12 @@ async def create_or_update_db_record(
         raise RuntimeError(f"Failed to create/update DB record: {e}") from e
 
 
-async def update_status_success(supabase: AsyncClient, image_id: str, file_name: str):
+async def update_status_success(
+    supabase: AsyncClient,
+    image_id: str,
+    file_name: str,
+    annotation_status: str = "uploaded",
+):
     """Update database record on successful upload."""
     try:
         uploaded_url = (
@@ -195,7 +284,7 @@ async def update_status_success(supabase: AsyncClient, image_id: str, file_name:
         )
         await supabase.table("annotated_memes").update(
             {
-                "annotation_status": "uploaded",
+                "annotation_status": annotation_status,
                 "uploaded_meme_url": uploaded_url,
                 "err_msg": None,
             }
@@ -265,8 +354,15 @@ async def process_single_file(
             raise ValueError("File content is empty")
         file_mime_type = file.content_type or "image/jpeg"
 
+        phash = await compute_file_phash(file_name, file_content)
+        reused = (
+            await find_reusable_annotations(supabase, phash, file_content)
+            if phash
+            else None
+        )
+
         image_id = await create_or_update_db_record(
-            supabase, file_name, file_content, file_mime_type, image_id
+            supabase, file_name, file_content, file_mime_type, image_id, phash, reused
         )
 
         file_options = {
@@ -274,16 +370,25 @@ async def process_single_file(
             "cache_control": "3600",
         }
 
+        await coordinator.acquire("supabase-storage")
         await supabase.storage.from_("memes").upload(image_id, file_content, file_options)  # type: ignore
 
-        await update_status_success(supabase, image_id, file_name)
+        await update_status_success(
+            supabase, image_id, file_name, resolve_success_status(reused)
+        )
 
-        return {
+        if phash:
+            phash_index.add(phash, image_id)
+
+        result = {
             "filename": file_name,
             "status": "success",
             "image_id": image_id,
             "action": action,
         }
+        if reused:
+            result["duplicate_of"] = reused["image_id"]
+        return result
 
     except Exception as e:
         error_msg = str(e)
@@ -315,7 +420,12 @@ async def process_files_in_batches(
 
     async def process_with_semaphore(file: UploadFile):
         async with semaphore:
-            return await process_single_file(supabase, file)
+            # Duplicate file names in this batch share one result; on other
+            # workers they wait for it and then find the file already uploaded.
+            return await coordinator.single_flight(
+                f"upload:{file.filename}",
+                lambda: process_single_file(supabase, file),
+            )
 
     tasks = [process_with_semaphore(file) for file in files]
     results = await asyncio.gather(*tasks, return_exceptions=True)
@@ -399,6 +509,468 @@ async def upload_files(files: List[UploadFile] = File(...)):
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+class SignedUploadFile(BaseModel):
+    file_name: str
+    content_type: str | None = None
+    size: int | None = None
+
+
+class SignedUploadRequest(BaseModel):
+    files: List[SignedUploadFile]
+
+
+class ConfirmUploadRequest(BaseModel):
+    image_ids: List[str]
+
+
+async def reserve_signed_upload(
+    supabase: AsyncClient, file: SignedUploadFile
+) -> Dict[str, Any]:
+    """Validate a file and reserve the row its signed upload URL will target.
+
+    Run under single_flight on the file name, so concurrent requests for the
+    same name reserve one row between them.
+    """
+    validation = validate_file_metadata(file.file_name, file.content_type, file.size)
+    if not validation["valid"]:
+        return {
+            "filename": file.file_name,
+            "status": "failed",
+            "error": "; ".join(validation["errors"]),
+            "action": "skipped",
+        }
+
+    file_status = await check_file_status(supabase, file.file_name)
+    if file_status["exists_in_db"] and file_status["exists_in_storage"]:
+        return {
+            "filename": file.file_name,
+            "status": "skipped",
+            "message": "File already exists in database and storage",
+            "action": "no_upload_needed",
+        }
+
+    image_id = file_status.get("image_id") or str(uuid4())
+    await supabase.table("annotated_memes").upsert(
+        {
+            "image_id": image_id,
+            "file_name": file.file_name,
+            "annotation_status": "pending_upload",
+            "uploaded_meme_url": None,
+            "err_msg": None,
+            "upload_reserved_at": datetime.now(timezone.utc).isoformat(),
+        },
+        on_conflict="image_id",
+    ).execute()
+
+    return {
+        "filename": file.file_name,
+        "status": "pending_upload",
+        "image_id": image_id,
+        "action": "upload_to_storage"
+        if file_status["exists_in_db"]
+        else "new_upload",
+    }
+
+
+@app.post("/upload/memes/signed-urls")
+async def create_signed_upload_urls(request: SignedUploadRequest):
+    """
+    Reserve DB rows and issue signed upload URLs so clients can upload meme
+    files straight to the `memes` bucket, then call /upload/memes/confirm.
+    """
+    try:
+        if not request.files:
+            raise HTTPException(status_code=400, detail="No files provided")
+
+        if len(request.files) > MAX_FILES_PER_BATCH:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Too many files. Maximum allowed: {MAX_FILES_PER_BATCH}, received: {len(request.files)}",
+            )
+
+        supabase = await get_supabase_client()
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_UPLOADS)
+
+        async def with_semaphore(coro):
+            async with semaphore:
+                return await coro
+
+        async def create_signed_upload_url(image_id: str):
+            await coordinator.acquire("supabase-storage")
+            return await supabase.storage.from_("memes").create_signed_upload_url(
+                image_id
+            )
+
+        async def reserve(file: SignedUploadFile):
+            # Same key as direct uploads, so a name is reserved once across workers
+            return await coordinator.single_flight(
+                f"upload:{file.file_name}",
+                lambda: reserve_signed_upload(supabase, file),
+            )
+
+        unique_files: Dict[str, SignedUploadFile] = {}
+        for file in request.files:
+            unique_files.setdefault(file.file_name, file)
+        reserved = dict(
+            zip(
+                unique_files,
+                await asyncio.gather(
+                    *(with_semaphore(reserve(f)) for f in unique_files.values())
+                ),
+            )
+        )
+        results = [
+            reserved[file.file_name]
+            if unique_files[file.file_name] is file
+            else {
+                "filename": file.file_name,
+                "status": "skipped",
+                "message": "Duplicate file name in this request",
+                "action": "duplicate_in_request",
+            }
+            for file in request.files
+        ]
+        pending = [r for r in results if r["status"] == "pending_upload"]
+
+        if pending:
+            signed_urls = await asyncio.gather(
+                *(
+                    with_semaphore(create_signed_upload_url(r["image_id"]))
+                    for r in pending
+                ),
+                return_exceptions=True,
+            )
+            for result, signed_url in zip(pending, signed_urls):
+                if isinstance(signed_url, Exception):
+                    result.update(
+                        {
+                            "status": "failed",
+                            "error": f"Failed to create signed upload URL: {signed_url}",
+                            "action": "error_occurred",
+                        }
+                    )
+                    await update_status_failed(
+                        supabase, result["image_id"], result["filename"], result["error"]
+                    )
+                else:
+                    result["signed_url"] = signed_url["signed_url"]
+                    result["token"] = signed_url["token"]
+
+        logger.info(
+            f"Issued {sum(1 for r in results if r['status'] == 'pending_upload')} signed upload URLs for {len(request.files)} files"
+        )
+        return {"total_files": len(request.files), "results": results}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Issuing signed upload URLs failed with unexpected error: {e}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+def stored_object_metadata(info: Dict[str, Any]) -> tuple[int | None, str | None]:
+    """Size and MIME type of a storage object from its info response.
+
+    Newer storage APIs return them top-level, older ones under `metadata`.
+    """
+    metadata = info.get("metadata") or {}
+    size = info.get("size", metadata.get("size"))
+    mime_type = info.get("content_type") or metadata.get("mimetype")
+    return (int(size) if size is not None else None), mime_type
+
+
+async def inspect_uploaded_object(
+    supabase: AsyncClient, image_id: str, file_name: str
+) -> Dict[str, Any]:
+    """Check a directly uploaded object against the size and MIME type limits.
+
+    Objects that fail are deleted and their row is marked upload_failed.
+    """
+    await coordinator.acquire("supabase-storage")
+    info = await supabase.storage.from_("memes").info(image_id)
+    size, mime_type = stored_object_metadata(info)
+
+    errors = []
+    if size is None or mime_type is None:
+        errors.append("Could not read size and MIME type of the uploaded object")
+    else:
+        errors = validate_file_metadata(file_name, mime_type, size)["errors"]
+
+    if errors:
+        error_msg = "; ".join(errors)
+        try:
+            await coordinator.acquire("supabase-storage")
+            await supabase.storage.from_("memes").remove([image_id])
+        except Exception as e:
+            logger.error(f"Failed to delete rejected object '{image_id}': {e}")
+        await update_status_failed(supabase, image_id, file_name, error_msg)
+        return {"valid": False, "error": error_msg}
+
+    return {"valid": True, "mime_type": mime_type}
+
+
+async def process_confirmed_upload(
+    supabase: AsyncClient, image_id: str, file_name: str, file_mime_type: str
+):
+    """OCR a meme the client uploaded directly to storage and mark it uploaded."""
+    try:
+        await coordinator.acquire("supabase-storage")
+        file_content = await supabase.storage.from_("memes").download(image_id)
+        if not file_content:
+            raise ValueError("File content is empty")
+
+        phash = await compute_file_phash(file_name, file_content)
+        reused = (
+            await find_reusable_annotations(supabase, phash, file_content)
+            if phash
+            else None
+        )
+        ocr_fields = await build_ocr_fields(file_content, file_mime_type, reused)
+
+        await supabase.table("annotated_memes").update(
+            {"phash": phash, **ocr_fields}
+        ).eq("image_id", image_id).execute()
+        await update_status_success(
+            supabase, image_id, file_name, resolve_success_status(reused)
+        )
+
+        if phash:
+            phash_index.add(phash, image_id)
+    except Exception as e:
+        logger.error(f"Failed to process confirmed upload '{file_name}': {e}")
+        await update_status_failed(supabase, image_id, file_name, str(e))
+
+
+async def process_confirmed_uploads(
+    supabase: AsyncClient, uploads: List[Dict[str, Any]]
+):
+    """Process confirmed uploads concurrently, like process_files_in_batches."""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_UPLOADS)
+
+    async def process_with_semaphore(upload: Dict[str, Any]):
+        async with semaphore:
+            await coordinator.single_flight(
+                f"confirm:{upload['image_id']}",
+                lambda: process_confirmed_upload(
+                    supabase,
+                    upload["image_id"],
+                    upload["file_name"],
+                    upload["mime_type"],
+                ),
+            )
+
+    await asyncio.gather(
+        *(process_with_semaphore(upload) for upload in uploads),
+        return_exceptions=True,
+    )
+
+
+async def requeue_stale_uploads(supabase: AsyncClient) -> int:
+    """Re-process confirmed uploads stuck in 'uploading' past UPLOAD_STALE_SECONDS."""
+    now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(seconds=UPLOAD_STALE_SECONDS)
+    response = (
+        await supabase.table("annotated_memes")
+        .select("image_id, file_name, upload_confirmed_at")
+        .eq("annotation_status", "uploading")
+        .lt("upload_confirmed_at", cutoff.isoformat())
+        .limit(MAX_FILES_PER_BATCH)
+        .execute()
+    )
+
+    uploads = []
+    for record in response.data:
+        # Claim by bumping upload_confirmed_at, so only one worker re-queues it
+        claim = (
+            await supabase.table("annotated_memes")
+            .update({"upload_confirmed_at": now.isoformat()})
+            .eq("image_id", record["image_id"])
+            .eq("annotation_status", "uploading")
+            .eq("upload_confirmed_at", record["upload_confirmed_at"])
+            .execute()
+        )
+        if not claim.data:
+            continue
+        try:
+            inspection = await inspect_uploaded_object(
+                supabase, record["image_id"], record["file_name"]
+            )
+        except Exception as e:
+            await update_status_failed(
+                supabase, record["image_id"], record["file_name"], str(e)
+            )
+            continue
+        if inspection["valid"]:
+            uploads.append({**record, "mime_type": inspection["mime_type"]})
+
+    if uploads:
+        logger.info(f"Re-queued {len(uploads)} stale confirmed uploads")
+        await process_confirmed_uploads(supabase, uploads)
+    return len(uploads)
+
+
+async def expire_pending_uploads(supabase: AsyncClient) -> int:
+    """Fail reservations not confirmed within PENDING_UPLOAD_TTL_SECONDS.
+
+    The row is kept so a later reservation of the same name reuses its
+    image id. Any object the client uploaded without confirming is deleted,
+    since it was never validated.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=PENDING_UPLOAD_TTL_SECONDS)
+    response = (
+        await supabase.table("annotated_memes")
+        .update(
+            {
+                "annotation_status": "upload_failed",
+                "err_msg": "Signed upload was never confirmed",
+            }
+        )
+        .eq("annotation_status", "pending_upload")
+        .lt("upload_reserved_at", cutoff.isoformat())
+        .execute()
+    )
+    image_ids = [record["image_id"] for record in response.data]
+    if image_ids:
+        try:
+            await coordinator.acquire("supabase-storage")
+            await supabase.storage.from_("memes").remove(image_ids)
+        except Exception as e:
+            logger.error(f"Failed to delete unconfirmed uploads: {e}")
+        logger.info(f"Expired {len(image_ids)} unconfirmed signed uploads")
+    return len(image_ids)
+
+
+async def sweep_stale_uploads():
+    """Periodically re-queue confirmed uploads lost to a restart or crash,
+    and expire reservations that were never confirmed."""
+    while True:
+        await asyncio.sleep(UPLOAD_SWEEP_INTERVAL_SECONDS)
+        try:
+            supabase = await get_supabase_client()
+            await requeue_stale_uploads(supabase)
+            await expire_pending_uploads(supabase)
+        except Exception as e:
+            logger.error(f"Stale upload sweep failed: {e}")
+
+
+@app.post("/upload/memes/confirm")
+async def confirm_uploads(
+    request: ConfirmUploadRequest, background_tasks: BackgroundTasks
+):
+    """
+    Verify that directly uploaded objects exist in storage and queue their OCR.
+    """
+    try:
+        if not request.image_ids:
+            raise HTTPException(status_code=400, detail="No image ids provided")
+
+        supabase = await get_supabase_client()
+        db_response = (
+            await supabase.table("annotated_memes")
+            .select("image_id, file_name, annotation_status")
+            .in_("image_id", request.image_ids)
+            .execute()
+        )
+        records = {record["image_id"]: record for record in db_response.data}
+        confirmed: List[Dict[str, Any]] = []
+
+        async def verify(image_id: str) -> Dict[str, Any]:
+            record = records.get(image_id)
+            if not record or record.get("annotation_status") != "pending_upload":
+                return {
+                    "image_id": image_id,
+                    "status": "failed",
+                    "error": "No pending upload for this image id",
+                }
+            try:
+                inspection = await inspect_uploaded_object(
+                    supabase, image_id, record["file_name"]
+                )
+            except Exception:
+                return {
+                    "image_id": image_id,
+                    "filename": record["file_name"],
+                    "status": "failed",
+                    "error": "Object not found in storage",
+                }
+            if not inspection["valid"]:
+                return {
+                    "image_id": image_id,
+                    "filename": record["file_name"],
+                    "status": "failed",
+                    "error": inspection["error"],
+                    "action": "deleted",
+                }
+
+            # Only one concurrent confirm of the same id wins this transition
+            claim = (
+                await supabase.table("annotated_memes")
+                .update(
+                    {
+                        "annotation_status": "uploading",
+                        "upload_confirmed_at": datetime.now(timezone.utc).isoformat(),
+                    }
+                )
+                .eq("image_id", image_id)
+                .eq("annotation_status", "pending_upload")
+                .execute()
+            )
+            if not claim.data:
+                return {
+                    "image_id": image_id,
+                    "filename": record["file_name"],
+                    "status": "failed",
+                    "error": "Upload already confirmed",
+                }
+            confirmed.append(
+                {
+                    "image_id": image_id,
+                    "file_name": record["file_name"],
+                    "mime_type": inspection["mime_type"],
+                }
+            )
+            return {
+                "image_id": image_id,
+                "filename": record["file_name"],
+                "status": "processing",
+            }
+
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_UPLOADS)
+
+        async def verify_with_semaphore(image_id: str):
+            async with semaphore:
+                return await verify(image_id)
+
+        results = await asyncio.gather(
+            *(verify_with_semaphore(image_id) for image_id in request.image_ids)
+        )
+        if confirmed:
+            background_tasks.add_task(process_confirmed_uploads, supabase, confirmed)
+        return {
+            "total_files": len(request.image_ids),
+            "confirmed": sum(1 for r in results if r["status"] == "processing"),
+            "results": results,
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Confirming uploads failed with unexpected error: {e}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@app.get("/metrics/model-routing")
+async def model_routing_metrics():
+    """Per-task model ranking, routing and fallback counts, and model health."""
+    return model_router.snapshot()
+
+
+@app.get("/metrics/event-loop")
+async def event_loop_metrics():
+    """Event loop scheduling delay measured by the loop lag monitor."""
+    return loop_lag_monitor.snapshot()
+
+
 # Health check endpoint for monitoring
 @app.get("/health")
 async def health_check():
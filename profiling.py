@@ -0,0 +1,263 @@
+import concurrent.futures.thread as futures_thread
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Literal, Tuple
+
+from executors import BLOCKING_IO_THREAD_PREFIX, CPU_THREAD_PREFIX
+
+logger = logging.getLogger(__name__)
+
+ProfileFormat = Literal["collapsed", "speedscope"]
+Frame = Tuple[str, str, int]
+
+EXECUTOR_THREAD_PREFIXES = (BLOCKING_IO_THREAD_PREFIX, CPU_THREAD_PREFIX)
+UNSAMPLED_NOTE = (
+    "OCR in the process pool is not sampled; its time shows up as the "
+    "event loop awaiting the pool."
+)
+
+
+def _walk_stack(frame) -> Tuple[Frame, ...]:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+def _is_running_work_item(stack: Tuple[Frame, ...]) -> bool:
+    """Whether an executor worker's stack is inside a task rather than idle on its queue."""
+    return any(
+        name == "run" and file == futures_thread.__file__ for name, file, _ in stack
+    )
+
+
+class ProfileSession:
+    """Samples the event loop and executor threads while requests to a route are in flight.
+
+    Requests run concurrently on one thread, so samples taken while a
+    matching request is active also include whatever else the loop was
+    doing at the time. The same holds for the blocking I/O and CPU
+    executors, whose busy workers are sampled under a root frame named
+    after their pool. Idle workers are skipped.
+    """
+
+    def __init__(
+        self,
+        route: str,
+        max_requests: int | None,
+        max_seconds: float | None,
+        interval_ms: float,
+        thread_id: int,
+    ):
+        self.route = route
+        self.max_requests = max_requests
+        self.deadline = time.monotonic() + max_seconds if max_seconds else None
+        self.interval = interval_ms / 1000
+        self.thread_id = thread_id
+        self.samples: Counter[Tuple[Frame, ...]] = Counter()
+        self._samples_lock = threading.Lock()
+        self.active_requests = 0
+        self.completed_requests = 0
+        self.started_at = time.time()
+        self.finished = threading.Event()
+        self._thread = threading.Thread(
+            target=self._sample, name="profiler-sampler", daemon=True
+        )
+
+    def matches(self, path: str) -> bool:
+        return path.startswith(self.route)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def join(self) -> None:
+        """Wait for the sampler thread to exit, after which samples no longer change."""
+        self.finished.set()
+        self._thread.join()
+
+    def request_started(self) -> None:
+        self.active_requests += 1
+
+    def request_finished(self) -> None:
+        self.active_requests -= 1
+        self.completed_requests += 1
+        if self.max_requests and self.completed_requests >= self.max_requests:
+            self.finished.set()
+
+    def _sample(self) -> None:
+        while not self.finished.is_set():
+            if self.deadline and time.monotonic() >= self.deadline:
+                self.finished.set()
+                break
+            if self.active_requests > 0:
+                self._take_sample()
+            self.finished.wait(self.interval)
+
+    def _take_sample(self) -> None:
+        frames = sys._current_frames()
+        frame = frames.get(self.thread_id)
+        stacks = []
+        if frame is not None:
+            stacks.append((("event-loop", "", 0), *_walk_stack(frame)))
+
+        for thread in threading.enumerate():
+            pool = thread.name.split("_", 1)[0]
+            if pool not in EXECUTOR_THREAD_PREFIXES:
+                continue
+            frame = frames.get(thread.ident)
+            if frame is None:
+                continue
+            stack = _walk_stack(frame)
+            if _is_running_work_item(stack):
+                stacks.append(((pool, "", 0), *stack))
+
+        with self._samples_lock:
+            self.samples.update(stacks)
+
+    def to_collapsed(self) -> str:
+        """Brendan Gregg's collapsed stack format, one `a;b;c count` line per stack."""
+        return "\n".join(
+            ";".join(f"{name} ({file}:{line})" for name, file, line in stack)
+            + f" {count}"
+            for stack, count in self.samples.most_common()
+        )
+
+    def to_speedscope(self) -> Dict[str, Any]:
+        frames: List[Frame] = []
+        frame_index: Dict[Frame, int] = {}
+        samples = []
+        weights = []
+        for stack, count in self.samples.items():
+            indexes = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    frames.append(frame)
+                indexes.append(frame_index[frame])
+            samples.append(indexes)
+            weights.append(count * self.interval)
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {
+                "frames": [
+                    {"name": name, "file": file, "line": line}
+                    for name, file, line in frames
+                ]
+            },
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": f"{self.route} ({self.completed_requests} requests)",
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+            ],
+            "name": f"Profile of {self.route}",
+            "activeProfileIndex": 0,
+            "exporter": "meme-annotation-backend",
+        }
+
+    def sample_count(self) -> int:
+        with self._samples_lock:
+            return sum(self.samples.values())
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "route": self.route,
+            "finished": self.finished.is_set(),
+            "completed_requests": self.completed_requests,
+            "max_requests": self.max_requests,
+            "samples": self.sample_count(),
+            "started_at": self.started_at,
+            "sampled_threads": ["event-loop", *EXECUTOR_THREAD_PREFIXES],
+            "pid": os.getpid(),
+            "note": UNSAMPLED_NOTE,
+        }
+
+
+class Profiler:
+    """Holds at most one profiling session at a time.
+
+    Sessions live in the worker process that started them. With several
+    uvicorn workers, /admin/profiler/start, the profiled requests and
+    /admin/profiler/result can land on different workers, so profile
+    with a single worker (or pin requests to one) to get useful results.
+    """
+
+    def __init__(self):
+        self.session: ProfileSession | None = None
+        self.last_session: ProfileSession | None = None
+
+    def start(
+        self,
+        route: str,
+        max_requests: int | None = None,
+        max_seconds: float | None = None,
+        interval_ms: float = 5.0,
+    ) -> ProfileSession:
+        if self.session is not None and not self.session.finished.is_set():
+            raise RuntimeError(f"A profiling session for '{self.session.route}' is already running")
+
+        session = ProfileSession(
+            route, max_requests, max_seconds, interval_ms, threading.get_ident()
+        )
+        session.start()
+        self.session = session
+        logger.info(
+            f"Profiling '{route}' for {max_requests or 'unlimited'} requests / {max_seconds or 'unlimited'} seconds"
+        )
+        return session
+
+    def stop(self) -> ProfileSession | None:
+        session = self.session
+        if session is not None:
+            session.join()
+            self.last_session = session
+            self.session = None
+        return session
+
+    def current(self) -> ProfileSession | None:
+        """The running session, or the most recent one once it has finished."""
+        if self.session is not None and self.session.finished.is_set():
+            self.stop()
+        return self.session or self.last_session
+
+
+profiler = Profiler()
+
+
+class ProfilerMiddleware:
+    """ASGI middleware that reports matching requests to the active session.
+
+    When no session is running this is a single attribute check per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        session = profiler.session
+        if (
+            session is None
+            or scope["type"] != "http"
+            or session.finished.is_set()
+            or not session.matches(scope["path"])
+        ):
+            return await self.app(scope, receive, send)
+
+        session.request_started()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            session.request_finished()
@@ -0,0 +1,108 @@
+import os
+import secrets
+from fastapi import Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from fastapi.routing import APIRouter
+from pydantic import BaseModel
+from profiling import ProfileFormat, profiler
+from db.export import ExportInProgressError, export_annotated_memes
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+async def require_admin_token(x_admin_token: str | None = Header(default=None)):
+    """
+    Allow the request only if it carries the ADMIN_TOKEN from the environment.
+    Admin endpoints are disabled entirely when ADMIN_TOKEN is not set.
+    """
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(
+        x_admin_token.encode(), admin_token.encode()
+    ):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    dependencies=[Depends(require_admin_token)],
+)
+
+
+class StartProfileRequest(BaseModel):
+    route: str
+    requests: int | None = None
+    seconds: float | None = 60.0
+    interval_ms: float = 5.0
+
+
+@router.post("/profiler/start")
+async def start_profiler(request: StartProfileRequest):
+    """
+    Sample the event loop and executor threads while requests to `route`
+    are in flight, for the next `requests` requests or `seconds` seconds,
+    whichever comes first.
+
+    Only this worker process is profiled; the returned `pid` identifies it.
+    Run a single worker while profiling so the profiled requests and the
+    result request reach it.
+    """
+    if not request.requests and not request.seconds:
+        raise HTTPException(
+            status_code=400, detail="Set at least one of 'requests' or 'seconds'"
+        )
+    try:
+        session = profiler.start(
+            request.route, request.requests, request.seconds, request.interval_ms
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return session.status()
+
+
+@router.post("/profiler/stop")
+async def stop_profiler():
+    """
+    Stop the running profiling session early.
+    """
+    session = profiler.stop()
+    if session is None:
+        raise HTTPException(status_code=404, detail="No profiling session is running")
+    return session.status()
+
+
+@router.get("/profiler/result")
+async def get_profiler_result(format: ProfileFormat = "collapsed"):
+    """
+    Return the current or last profile as collapsed stacks (for flamegraph.pl
+    or speedscope) or as speedscope JSON.
+    """
+    session = profiler.current()
+    if session is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No profiling session found in worker {os.getpid()}",
+        )
+    if not session.finished.is_set():
+        return session.status()
+    if format == "speedscope":
+        return session.to_speedscope()
+    return PlainTextResponse(session.to_collapsed())
+
+
+@router.post("/export")
+async def export_dataset(compact: bool = False):
+    """
+    Export annotated_memes rows changed since the last export to the local
+    Parquet dataset, optionally compacting it afterwards.
+    """
+    try:
+        return await export_annotated_memes(force_compact=compact)
+    except ExportInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Dataset export failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Dataset export failed: {e}")
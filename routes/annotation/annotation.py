@@ -1,7 +1,8 @@
 from fastapi.routing import APIRouter
 from pydantic import BaseModel
-from ai.annotator_agent import AnnotatorAgent
-from ai.context_search_agent import ContextSearchAgent
+from ai.annotator_agent import get_annotator_agent
+from ai.checkpointer import ainvoke_resumable
+from ai.context_search_agent import get_context_search_agent
 from db.config import get_supabase_client
 import logging
 
@@ -28,9 +29,13 @@ class RequestModel(BaseModel):
 
 @router.post("/annotate")
 async def annotate_meme(request: RequestModel):
-    print(f"Received request to annotate meme: {request}")
+    logger.info(f"Received request to annotate meme: {request.meme_id}")
     try:
-        response = await AnnotatorAgent.ainvoke(input={"image_url": request.meme_url})
+        response = await ainvoke_resumable(
+            await get_annotator_agent(),
+            f"annotate:{request.meme_id}",
+            {"image_url": request.meme_url},
+        )
     except Exception as e:
         return {"error": str(e), "message": "Agent failed to process the meme."}
 
@@ -70,10 +75,12 @@ async def extract_context(request: RequestModel):
     """
     Extract context for a meme image using the annotation agent.
     """
-    print(f"Received request to extract context for meme: {request}")
+    logger.info(f"Received request to extract context for meme: {request.meme_id}")
     try:
-        response = await ContextSearchAgent.ainvoke(
-            input={"image_url": request.meme_url}
+        response = await ainvoke_resumable(
+            await get_context_search_agent(),
+            f"context:{request.meme_id}",
+            {"image_url": request.meme_url},
         )
     except Exception as e:
         return {"error": str(e), "message": "Agent failed to process the meme."}
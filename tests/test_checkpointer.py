@@ -0,0 +1,133 @@
+import asyncio
+from typing import TypedDict
+
+import pytest
+from langgraph.graph import END, START, StateGraph
+
+from ai import checkpointer
+
+
+class CountState(TypedDict):
+    count: int
+
+
+def increment(state: CountState) -> CountState:
+    return {"count": state["count"] + 1}
+
+
+@pytest.fixture
+def checkpoint_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpointer, "CHECKPOINT_DB_PATH", str(tmp_path / "checkpoints.sqlite"))
+    monkeypatch.setattr(checkpointer, "_checkpointer", None)
+    return tmp_path / "checkpoints.sqlite"
+
+
+def test_agent_compiled_with_checkpointer_runs(checkpoint_db):
+    workflow = StateGraph(CountState)
+    workflow.add_node("increment", increment)
+    workflow.add_edge(START, "increment")
+    workflow.add_edge("increment", END)
+
+    async def run():
+        try:
+            agent = workflow.compile(checkpointer=await checkpointer.get_checkpointer())
+            return await checkpointer.ainvoke_resumable(agent, "test:1", {"count": 1})
+        finally:
+            await checkpointer.close_checkpointer()
+
+    assert asyncio.run(run()) == {"count": 2}
+    assert checkpoint_db.exists()
+
+
+def test_failed_setup_closes_connection(checkpoint_db, monkeypatch):
+    closed = []
+
+    async def failing_setup(self):
+        raise RuntimeError("setup failed")
+
+    original_close = checkpointer.aiosqlite.Connection.close
+
+    async def recording_close(self):
+        closed.append(self)
+        await original_close(self)
+
+    monkeypatch.setattr(checkpointer.AsyncSqliteSaver, "setup", failing_setup)
+    monkeypatch.setattr(checkpointer.aiosqlite.Connection, "close", recording_close)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(checkpointer.get_checkpointer())
+
+    assert len(closed) == 1
+    assert checkpointer._checkpointer is None
+
+
+class ContextState(TypedDict, total=False):
+    keyword: str
+    context: str
+
+
+def search(state: ContextState) -> ContextState:
+    if not state.get("keyword"):
+        return {}
+    return {"context": f"context for {state['keyword']}"}
+
+
+def build_context_agent():
+    workflow = StateGraph(ContextState)
+    workflow.add_node("search", search)
+    workflow.add_edge(START, "search")
+    workflow.add_edge("search", END)
+    return workflow
+
+
+def test_completed_thread_does_not_leak_into_next_run(checkpoint_db):
+    async def run():
+        try:
+            agent = build_context_agent().compile(
+                checkpointer=await checkpointer.get_checkpointer()
+            )
+            first = await checkpointer.ainvoke_resumable(agent, "context:1", {"keyword": "cat"})
+            second = await checkpointer.ainvoke_resumable(agent, "context:1", {"keyword": ""})
+            state = await agent.aget_state({"configurable": {"thread_id": "context:1"}})
+            return first, second, state
+        finally:
+            await checkpointer.close_checkpointer()
+
+    first, second, state = asyncio.run(run())
+
+    assert first["context"] == "context for cat"
+    assert "context" not in second
+    assert state.values == {}
+
+
+def test_failed_run_resumes_from_last_completed_node(checkpoint_db):
+    calls = []
+
+    def first_step(state: CountState) -> CountState:
+        calls.append("first")
+        return {"count": state["count"] + 1}
+
+    def flaky_step(state: CountState) -> CountState:
+        calls.append("flaky")
+        if calls.count("flaky") == 1:
+            raise RuntimeError("transient failure")
+        return {"count": state["count"] * 10}
+
+    workflow = StateGraph(CountState)
+    workflow.add_node("first", first_step)
+    workflow.add_node("flaky", flaky_step)
+    workflow.add_edge(START, "first")
+    workflow.add_edge("first", "flaky")
+    workflow.add_edge("flaky", END)
+
+    async def run():
+        try:
+            agent = workflow.compile(checkpointer=await checkpointer.get_checkpointer())
+            with pytest.raises(RuntimeError):
+                await checkpointer.ainvoke_resumable(agent, "annotate:1", {"count": 1})
+            return await checkpointer.ainvoke_resumable(agent, "annotate:1", {"count": 1})
+        finally:
+            await checkpointer.close_checkpointer()
+
+    assert asyncio.run(run()) == {"count": 20}
+    assert calls == ["first", "flaky", "flaky"]
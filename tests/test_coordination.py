@@ -0,0 +1,178 @@
+import asyncio
+
+import pytest
+
+from db.coordination import Coordinator, InMemoryCoordinationBackend
+
+
+class RecordingBackend(InMemoryCoordinationBackend):
+    """In-memory backend that records lease claims and releases."""
+
+    def __init__(self):
+        super().__init__()
+        self.claims = []
+        self.releases = []
+
+    async def try_claim(self, key, owner, ttl_seconds):
+        self.claims.append(key)
+        return await super().try_claim(key, owner, ttl_seconds)
+
+    async def release(self, key, owner):
+        self.releases.append(key)
+        await super().release(key, owner)
+
+
+def test_token_bucket_allows_burst_up_to_capacity():
+    backend = InMemoryCoordinationBackend()
+
+    async def take(count):
+        return [await backend.acquire_tokens("api", 5, 3) for _ in range(count)]
+
+    waits = asyncio.run(take(4))
+
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    assert waits[3] == pytest.approx(1 / 5, rel=0.1)
+
+
+def test_token_bucket_refills_over_time():
+    backend = InMemoryCoordinationBackend()
+
+    async def drain_and_wait():
+        await backend.acquire_tokens("api", 20, 1)
+        assert await backend.acquire_tokens("api", 20, 1) > 0
+        await asyncio.sleep(0.06)
+        return await backend.acquire_tokens("api", 20, 1)
+
+    assert asyncio.run(drain_and_wait()) == 0.0
+
+
+def test_acquire_waits_once_the_burst_is_spent():
+    # Capacity equals the rate, so 10 calls pass at once and the 11th waits
+    async def acquire(count):
+        coordinator = Coordinator(InMemoryCoordinationBackend(), rate_limits={"api": 10})
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for _ in range(count):
+            await coordinator.acquire("api")
+        return loop.time() - started
+
+    assert asyncio.run(acquire(10)) < 0.05
+    assert asyncio.run(acquire(11)) >= 0.05
+
+
+def test_acquire_ignores_unlimited_dependencies():
+    coordinator = Coordinator(InMemoryCoordinationBackend(), rate_limits={})
+    asyncio.run(coordinator.acquire("anything"))
+
+
+def test_single_flight_shares_result_between_concurrent_callers():
+    backend = RecordingBackend()
+    coordinator = Coordinator(backend)
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "done"
+
+    async def run_concurrently():
+        return await asyncio.gather(
+            *(coordinator.single_flight("key", work) for _ in range(5))
+        )
+
+    assert asyncio.run(run_concurrently()) == ["done"] * 5
+    assert len(calls) == 1
+    assert backend.claims == ["key"]
+    assert backend.releases == ["key"]
+    assert backend._leases == {}
+
+
+def test_single_flight_propagates_exceptions_and_releases_lease():
+    backend = RecordingBackend()
+    coordinator = Coordinator(backend)
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def run_concurrently():
+        return await asyncio.gather(
+            *(coordinator.single_flight("key", work) for _ in range(3)),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(run_concurrently())
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert backend.releases == ["key"]
+    assert backend._leases == {}
+    assert coordinator._inflight == {}
+
+
+def test_single_flight_runs_again_after_completion():
+    coordinator = Coordinator(InMemoryCoordinationBackend())
+    calls = []
+
+    async def work():
+        calls.append(1)
+        return len(calls)
+
+    async def run_twice():
+        return [
+            await coordinator.single_flight("key", work),
+            await coordinator.single_flight("key", work),
+        ]
+
+    assert asyncio.run(run_twice()) == [1, 2]
+
+
+def test_try_claim_blocks_other_owners_until_expiry():
+    backend = InMemoryCoordinationBackend()
+
+    async def claims():
+        first = await backend.try_claim("key", "a", 0.05)
+        blocked = await backend.try_claim("key", "b", 0.05)
+        renewed = await backend.try_claim("key", "a", 0.05)
+        await asyncio.sleep(0.06)
+        after_expiry = await backend.try_claim("key", "b", 0.05)
+        return first, blocked, renewed, after_expiry
+
+    assert asyncio.run(claims()) == (True, False, True, True)
+
+
+def test_release_only_frees_own_lease():
+    backend = InMemoryCoordinationBackend()
+
+    async def claims():
+        await backend.try_claim("key", "a", 60)
+        await backend.release("key", "b")
+        blocked = await backend.try_claim("key", "b", 60)
+        await backend.release("key", "a")
+        freed = await backend.try_claim("key", "b", 60)
+        return blocked, freed
+
+    assert asyncio.run(claims()) == (False, True)
+
+
+def test_single_flight_renews_lease_while_work_runs():
+    backend = InMemoryCoordinationBackend()
+    coordinator = Coordinator(backend, lease_ttl_seconds=0.05)
+    other = Coordinator(backend, lease_ttl_seconds=0.05)
+    claimed_by_other = []
+
+    async def slow_work():
+        for _ in range(4):
+            await asyncio.sleep(0.05)
+            claimed_by_other.append(
+                await backend.try_claim("key", other.owner, 0.05)
+            )
+        return "done"
+
+    async def run():
+        result = await coordinator.single_flight("key", slow_work)
+        await asyncio.sleep(0.05)
+        return result
+
+    assert asyncio.run(run()) == "done"
+    assert claimed_by_other == [False] * 4
+    assert backend._leases == {}
@@ -0,0 +1,17 @@
+import pytest
+
+from db.export import ExportInProgressError, export_lock
+
+
+def test_export_lock_rejects_a_second_export(tmp_path):
+    with export_lock(tmp_path):
+        with pytest.raises(ExportInProgressError):
+            with export_lock(tmp_path):
+                pass
+
+
+def test_export_lock_is_released_after_the_run(tmp_path):
+    with export_lock(tmp_path):
+        pass
+    with export_lock(tmp_path):
+        pass
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+import ai.model_router
+from ai.model_router import ModelRouter
+from db.coordination import Coordinator, InMemoryCoordinationBackend
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limits(monkeypatch):
+    monkeypatch.setattr(
+        ai.model_router, "coordinator", Coordinator(InMemoryCoordinationBackend(), rate_limits={})
+    )
+
+
+def fake_models(behaviour):
+    """Build runnables whose behaviour per model is a delay in seconds or an exception."""
+    calls = []
+
+    def build(model):
+        async def invoke(input):
+            calls.append(model)
+            outcome = behaviour[model]
+            if isinstance(outcome, Exception):
+                raise outcome
+            await asyncio.sleep(outcome)
+            return f"{model}:{input}"
+
+        return RunnableLambda(invoke)
+
+    return build, calls
+
+
+def test_unmeasured_models_are_each_tried_then_fastest_wins():
+    router = ModelRouter({"ocr": ["slow", "fast"]})
+    build, calls = fake_models({"slow": 0.03, "fast": 0.0})
+
+    async def run():
+        return [await router.ainvoke("ocr", build, i) for i in range(4)]
+
+    assert asyncio.run(run()) == ["slow:0", "fast:1", "fast:2", "fast:3"]
+    assert router.rank("ocr") == ["fast", "slow"]
+
+
+def test_falls_back_on_error():
+    router = ModelRouter({"ocr": ["broken", "ok"]})
+    build, calls = fake_models({"broken": ValueError("boom"), "ok": 0.0})
+
+    assert asyncio.run(router.ainvoke("ocr", build, "x")) == "ok:x"
+    assert calls == ["broken", "ok"]
+    assert router.fallbacks["ocr"] == 1
+    assert router.rank("ocr") == ["ok", "broken"]
+
+
+def test_falls_back_on_timeout():
+    router = ModelRouter({"ocr": ["hangs", "ok"]}, timeout_seconds=0.02)
+    build, calls = fake_models({"hangs": 1.0, "ok": 0.0})
+
+    assert asyncio.run(router.ainvoke("ocr", build, "x")) == "ok:x"
+    assert router.timeouts[("ocr", "hangs")] == 1
+    assert router.snapshot()["tasks"]["ocr"]["models"]["hangs"]["timeouts"] == 1
+
+
+def test_raises_when_every_model_fails():
+    router = ModelRouter({"ocr": ["a", "b"]})
+    build, calls = fake_models({"a": ValueError("a"), "b": ValueError("b")})
+
+    with pytest.raises(RuntimeError, match="All models failed for task 'ocr'"):
+        asyncio.run(router.ainvoke("ocr", build, "x"))
+    assert calls == ["a", "b"]
+
+
+def test_repeated_failures_mark_model_unhealthy():
+    router = ModelRouter({"ocr": ["flaky", "ok"]})
+    build, calls = fake_models({"flaky": ValueError("down"), "ok": 0.0})
+
+    for _ in range(3):
+        router._stats("ocr", "flaky").record(None, ok=False)
+
+    assert not router._stats("ocr", "flaky").is_healthy()
+    assert router.rank("ocr") == ["ok", "flaky"]
+
+
+def test_expired_stats_give_a_demoted_model_another_try():
+    router = ModelRouter({"translate": ["primary", "backup"]}, stats_ttl_seconds=0.1)
+    behaviour = {"primary": ValueError("overloaded"), "backup": 0.0}
+    build, calls = fake_models(behaviour)
+
+    async def run():
+        await router.ainvoke("translate", build, 1)
+        behaviour["primary"] = 0.0
+        await asyncio.sleep(0.06)
+        # The healthy leader keeps getting traffic and fresh stats...
+        second = await router.ainvoke("translate", build, 2)
+        await asyncio.sleep(0.06)
+        # ...while the demoted model's stats expire and it is probed again
+        return second, await router.ainvoke("translate", build, 3)
+
+    assert asyncio.run(run()) == ("backup:2", "primary:3")
+
+
+def test_stats_are_kept_per_task():
+    router = ModelRouter({"ocr": ["a", "b"], "translate": ["a", "b"]})
+    build, calls = fake_models({"a": ValueError("bad at ocr"), "b": 0.0})
+
+    asyncio.run(router.ainvoke("ocr", build, "x"))
+
+    assert router.rank("ocr") == ["b", "a"]
+    assert router.rank("translate") == ["a", "b"]
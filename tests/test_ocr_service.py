@@ -0,0 +1,173 @@
+import asyncio
+
+from ai.ocr_service import LLMOCRBackend, OCRBackend, OCRResult, OCRService
+
+
+class FakeLLMBackend(LLMOCRBackend):
+    """LLM backend that records calls instead of reaching OpenRouter."""
+
+    def __init__(self, batch_size=4, batch_wait_ms=20, missing=(), fail_batches=False):
+        super().__init__(batch_size=batch_size, batch_wait_ms=batch_wait_ms)
+        self.missing = set(missing)
+        self.fail_batches = fail_batches
+        self.batch_sizes = []
+        self.single_calls = []
+
+    async def extract_many(self, images):
+        self.batch_sizes.append(len(images))
+        if self.fail_batches:
+            raise ValueError("unparseable response")
+        return {
+            index: f"batch:{content.decode()}"
+            for index, (content, _) in enumerate(images)
+            if index not in self.missing
+        }
+
+    async def extract_single(self, file_content, file_mime_type):
+        self.single_calls.append(file_content.decode())
+        if file_content == b"broken":
+            raise RuntimeError("model error")
+        return OCRResult(
+            text=f"single:{file_content.decode()}", confidence=100.0, backend=self.name
+        )
+
+
+async def extract_all(backend, names):
+    return await asyncio.gather(
+        *(backend.extract_text(name.encode(), "image/png") for name in names),
+        return_exceptions=True,
+    )
+
+
+def test_full_batches_are_sent_as_one_request():
+    backend = FakeLLMBackend(batch_size=4)
+    results = asyncio.run(extract_all(backend, [f"img{i}" for i in range(8)]))
+
+    assert backend.batch_sizes == [4, 4]
+    assert backend.single_calls == []
+    assert [r.text for r in results] == [f"batch:img{i}" for i in range(8)]
+
+
+def test_partial_batch_is_flushed_after_wait():
+    backend = FakeLLMBackend(batch_size=8, batch_wait_ms=10)
+    results = asyncio.run(extract_all(backend, ["a", "b", "c"]))
+
+    assert backend.batch_sizes == [3]
+    assert [r.text for r in results] == ["batch:a", "batch:b", "batch:c"]
+
+
+def test_lone_image_uses_single_call():
+    backend = FakeLLMBackend(batch_size=8, batch_wait_ms=10)
+    results = asyncio.run(extract_all(backend, ["only"]))
+
+    assert backend.batch_sizes == []
+    assert [r.text for r in results] == ["single:only"]
+
+
+def test_images_missing_from_batch_fall_back_to_single_calls():
+    backend = FakeLLMBackend(batch_size=3, missing={1})
+    results = asyncio.run(extract_all(backend, ["a", "b", "c"]))
+
+    assert backend.single_calls == ["b"]
+    assert [r.text for r in results] == ["batch:a", "single:b", "batch:c"]
+
+
+def test_failed_batch_falls_back_for_every_image():
+    backend = FakeLLMBackend(batch_size=2, fail_batches=True)
+    results = asyncio.run(extract_all(backend, ["a", "b"]))
+
+    assert sorted(backend.single_calls) == ["a", "b"]
+    assert [r.text for r in results] == ["single:a", "single:b"]
+
+
+def test_single_call_errors_reach_only_their_caller():
+    backend = FakeLLMBackend(batch_size=2, fail_batches=True)
+    results = asyncio.run(extract_all(backend, ["a", "broken"]))
+
+    assert results[0].text == "single:a"
+    assert isinstance(results[1], RuntimeError)
+
+
+def test_batch_size_one_bypasses_batcher():
+    backend = FakeLLMBackend(batch_size=1)
+    results = asyncio.run(extract_all(backend, ["a", "b"]))
+
+    assert backend.batch_sizes == []
+    assert [r.text for r in results] == ["single:a", "single:b"]
+
+
+class FakeBackend(OCRBackend):
+    """OCR backend returning a fixed result, or raising, and counting calls."""
+
+    def __init__(self, name, result=None, error=None, available=True):
+        self.name = name
+        self.result = result
+        self.error = error
+        self.available = available
+        self.calls = 0
+
+    async def is_available(self):
+        return self.available
+
+    async def extract_text(self, file_content, file_mime_type):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return self.result
+
+
+def run_service(local):
+    fallback = FakeBackend("llm", OCRResult(text="llm text", confidence=100.0, backend="llm"))
+    service = OCRService(local, fallback, min_confidence=80, supported_scripts={"Latin", "Bengali"})
+    result = asyncio.run(service.extract_text(b"image", "image/png"))
+    return result, fallback
+
+
+def local_result(text="local text", confidence=95.0, script="Latin"):
+    return OCRResult(text=text, confidence=confidence, backend="tesseract", script=script)
+
+
+def test_confident_local_result_is_kept():
+    result, fallback = run_service(FakeBackend("tesseract", local_result()))
+
+    assert result.backend == "tesseract"
+    assert fallback.calls == 0
+
+
+def test_low_confidence_escalates():
+    result, fallback = run_service(FakeBackend("tesseract", local_result(confidence=40.0)))
+
+    assert result.backend == "llm"
+    assert fallback.calls == 1
+
+
+def test_empty_text_escalates():
+    result, _ = run_service(FakeBackend("tesseract", local_result(text="  \n")))
+
+    assert result.backend == "llm"
+
+
+def test_unsupported_script_escalates_even_when_confident():
+    result, _ = run_service(FakeBackend("tesseract", local_result(script="Devanagari")))
+
+    assert result.backend == "llm"
+
+
+def test_undetected_script_relies_on_confidence():
+    result, _ = run_service(FakeBackend("tesseract", local_result(script=None)))
+
+    assert result.backend == "tesseract"
+
+
+def test_unavailable_local_backend_is_skipped():
+    local = FakeBackend("tesseract", local_result(), available=False)
+    result, _ = run_service(local)
+
+    assert result.backend == "llm"
+    assert local.calls == 0
+
+
+def test_local_backend_error_escalates():
+    result, _ = run_service(FakeBackend("tesseract", error=RuntimeError("crashed")))
+
+    assert result.backend == "llm"
@@ -0,0 +1,105 @@
+import io
+import random
+
+from PIL import Image, ImageDraw, ImageFont
+
+from db.phash_index import (
+    BKTree,
+    PhashIndex,
+    compute_phash,
+    hamming_distance,
+    images_match,
+)
+
+
+def brute_force(values, query, max_distance):
+    return sorted(
+        (hamming_distance(query, value), image_id)
+        for image_id, value in values.items()
+        if hamming_distance(query, value) <= max_distance
+    )
+
+
+def test_search_matches_brute_force():
+    rng = random.Random(0)
+    values = {f"id{i}": rng.getrandbits(64) for i in range(2000)}
+    tree = BKTree()
+    for image_id, value in values.items():
+        tree.add(value, image_id)
+
+    for image_id in list(values)[:50]:
+        query = values[image_id] ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64))
+        assert tree.search(query, 6) == brute_force(values, query, 6)
+
+
+def test_same_hash_keeps_every_image_id_once():
+    tree = BKTree()
+    tree.add(0b1010, "a")
+    tree.add(0b1010, "b")
+    tree.add(0b1010, "a")
+
+    assert len(tree) == 2
+    assert tree.search(0b1010, 0) == [(0, "a"), (0, "b")]
+
+
+def test_empty_tree_returns_nothing():
+    assert BKTree().search(123, 10) == []
+
+
+def test_index_respects_max_distance():
+    index = PhashIndex(max_distance=2)
+    index.add("00000000000000ff", "near")
+    index.add("000000000000ffff", "far")
+
+    assert index.find_near_duplicates("00000000000000fc") == [(2, "near")]
+
+
+def encode(image: Image.Image, format: str, **kwargs) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **kwargs)
+    return buffer.getvalue()
+
+
+def test_phash_survives_resize_and_recompression():
+    image = Image.effect_mandelbrot((256, 256), (-2, -1.5, 1, 1.5), 100).convert("RGB")
+    original = compute_phash(encode(image, "PNG"))
+    copy = compute_phash(encode(image.resize((128, 128)), "JPEG", quality=60))
+
+    assert hamming_distance(int(original, 16), int(copy, 16)) <= 6
+
+
+def test_phash_differs_for_different_images():
+    mandelbrot = Image.effect_mandelbrot((256, 256), (-2, -1.5, 1, 1.5), 100)
+    noise = Image.effect_noise((256, 256), 64)
+
+    first = compute_phash(encode(mandelbrot, "PNG"))
+    second = compute_phash(encode(noise, "PNG"))
+
+    assert hamming_distance(int(first, 16), int(second, 16)) > 6
+
+
+def captioned_meme(top: str, bottom: str) -> Image.Image:
+    image = Image.effect_mandelbrot((600, 600), (-2, -1.5, 1, 1.5), 100).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=40)
+    for position, text in (((20, 20), top), ((20, 520), bottom)):
+        draw.text(position, text, font=font, fill="white", stroke_width=3, stroke_fill="black")
+    return image
+
+
+def test_same_template_with_different_captions_is_not_confirmed():
+    first = encode(captioned_meme("WHEN YOU WAKE UP", "AND IT'S MONDAY"), "JPEG", quality=90)
+    second = encode(captioned_meme("ME AFTER EXAMS", "FINALLY FREE"), "JPEG", quality=90)
+
+    # The 64-bit hash alone can't tell them apart...
+    assert hamming_distance(int(compute_phash(first), 16), int(compute_phash(second), 16)) <= 6
+    # ...but the confirmation step can
+    assert not images_match(first, second)
+
+
+def test_recompressed_copy_is_confirmed():
+    image = captioned_meme("WHEN YOU WAKE UP", "AND IT'S MONDAY")
+    original = encode(image, "PNG")
+    copy = encode(image.resize((400, 400)), "JPEG", quality=60)
+
+    assert images_match(original, copy)